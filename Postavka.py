@@ -5,7 +5,7 @@ from typing import Iterable, Set
 
 import aiogram
 from aiogram import Bot, Dispatcher, types, Router
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
@@ -19,11 +19,12 @@ except Exception:
 # Разделы
 from notes import register_notes_handlers
 from calc import register_calc_handlers
-from docs import register_docs_handlers
+from docs import register_docs_handlers, open_docs_root, prewarm as docs_prewarm, close_http as docs_close_http
 from reminders import register_reminders_handlers
 
 # Доступ (Mongo)
 from db import get_allowed_set, add_allowed, remove_allowed
+from chunked import answer_chunked
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
 logging.info("Aiogram version: %s", aiogram.__version__)
@@ -91,13 +92,15 @@ async def cmd_users(message: types.Message):
     admins = ", ".join(map(str, sorted(ENV_ADMINS))) or "—"
     allowed_env = ", ".join(map(str, sorted(ENV_ALLOWED))) or "—"
     allowed_db = ", ".join(map(str, sorted(dyn))) or "—"
-    await message.reply(
+    await answer_chunked(
+        message,
         "*Админы (ENV):*\n"
         f"`{admins}`\n\n"
         "*Допущенные (ENV):*\n"
         f"`{allowed_env}`\n\n"
         "*Допущенные (Mongo):*\n"
         f"`{allowed_db}`",
+        reply=True,
         parse_mode="Markdown"
     )
 
@@ -173,12 +176,14 @@ async def cmd_whoami(message: types.Message):
     await message.reply(f"Ваш Telegram ID: `{message.from_user.id}`", parse_mode="Markdown")
 
 @dp.message(Command("start"))
-async def start(message: types.Message, state: FSMContext):
+async def start(message: types.Message, state: FSMContext, command: CommandObject):
     if not is_authorized(message.from_user.id):
         await refuse(message); return
     await state.clear()
     kb = admin_kb if is_admin(message.from_user.id) else main_kb
     await message.answer("Главное меню:", reply_markup=kb)
+    if command.args == "docs":  # кнопка «Открыть все документы» из inline-режима
+        await open_docs_root(message)
 
 @dp.message(Command("cancel"))
 async def cancel_any(message: types.Message, state: FSMContext):
@@ -213,7 +218,11 @@ async def refresh_access_cache():
 async def main():
     setup_handlers()
     await refresh_access_cache()
-    await dp.start_polling(bot)
+    await docs_prewarm()  # снимок дерева и file_id — как в webhook-режиме
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await docs_close_http()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,195 @@
+# blobcache.py — двухуровневый кэш содержимого по SHA: LRU в памяти + файлы на локальном диске
+import os
+import asyncio
+import logging
+import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+
+log = logging.getLogger("blobcache")
+
+
+class BlobCache:
+    """
+    Ключ — SHA содержимого, поэтому записи никогда не устаревают и не требуют перепроверки.
+    Память: LRU с лимитом в байтах. Диск: каталог с лимитом в байтах, вытесняются самые
+    давно использованные файлы (по mtime — при попадании файл «трогаем»).
+    """
+
+    def __init__(self, mem_limit: int, disk_dir: str, disk_limit: int, mem_item_limit: Optional[int] = None):
+        self.mem_limit = mem_limit
+        self.mem_item_limit = mem_limit if mem_item_limit is None else mem_item_limit  # крупное живёт только на диске
+        self.disk_dir = disk_dir
+        self.disk_limit = disk_limit
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._disk_bytes: Optional[int] = None  # посчитаем при первом обращении к диску
+        self._lock = asyncio.Lock()
+        self._pins: Dict[str, int] = {}  # sha -> сколько отправок сейчас читают файл с диска
+        self.stats: Dict[str, int] = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    # ---------- память ----------
+    def _mem_get(self, sha: str) -> Optional[bytes]:
+        data = self._mem.get(sha)
+        if data is not None:
+            self._mem.move_to_end(sha)
+        return data
+
+    def _mem_put(self, sha: str, data: bytes) -> None:
+        if len(data) > min(self.mem_limit, self.mem_item_limit):
+            return
+        old = self._mem.pop(sha, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[sha] = data
+        self._mem_bytes += len(data)
+        while self._mem_bytes > self.mem_limit:
+            _, dropped = self._mem.popitem(last=False)
+            self._mem_bytes -= len(dropped)
+            self.stats["evictions"] += 1
+
+    # ---------- диск ----------
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.disk_dir, sha)
+
+    def _disk_scan(self) -> int:
+        os.makedirs(self.disk_dir, exist_ok=True)
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and not entry.name.startswith(".tmp-"):  # недокачанное посчитает put_file
+                total += entry.stat().st_size
+        return total
+
+    def _disk_get(self, sha: str) -> Optional[bytes]:
+        path = self._path(sha)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # отметка «недавно использован» для вытеснения
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _disk_adopt(self, sha: str, tmp: str) -> int:
+        """Забирает готовый файл (скачанный потоком) под именем sha; возвращает прирост каталога."""
+        path = self._path(sha)
+        if os.path.exists(path):
+            os.remove(tmp)
+            return 0
+        size = os.path.getsize(tmp)
+        os.replace(tmp, path)
+        return size
+
+    def _disk_touch(self, sha: str) -> Optional[str]:
+        path = self._path(sha)
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            return None
+
+    def _disk_evict(self, need: int, keep: Set[str]) -> int:
+        """Удаляет самые старые файлы (кроме keep), пока не освободится `need` байт; возвращает освобождённое."""
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and not entry.name.startswith(".tmp-") and entry.name not in keep:
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+        files.sort()
+        freed = 0
+        for _, size, path in files:
+            if freed >= need:
+                break
+            try:
+                os.remove(path)
+                freed += size
+                self.stats["evictions"] += 1
+            except FileNotFoundError:
+                pass
+        return freed
+
+    # ---------- API ----------
+    @staticmethod
+    def _valid(sha: str) -> bool:
+        return bool(sha) and all(c in "0123456789abcdef" for c in sha.lower())
+
+    async def get(self, sha: str, *, count: bool = True) -> Optional[bytes]:
+        """count=False — повторное чтение того же запроса (после скачивания), в статистику не идёт."""
+        if not self._valid(sha):
+            return None
+        data = self._mem_get(sha)
+        if data is not None:
+            if count:
+                self.stats["mem_hits"] += 1
+            return data
+        try:
+            data = await asyncio.to_thread(self._disk_get, sha)
+        except OSError as e:
+            log.warning("Blob cache: disk read failed for %s: %s", sha, e)
+            data = None
+        if data is not None:
+            if count:
+                self.stats["disk_hits"] += 1
+            self._mem_put(sha, data)
+            return data
+        if count:
+            self.stats["misses"] += 1
+        return None
+
+    def temp_path(self) -> str:
+        """Временный файл в каталоге кэша (та же ФС — put_file сделает атомарный rename)."""
+        os.makedirs(self.disk_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, prefix=".tmp-")
+        os.close(fd)
+        return tmp
+
+    async def file(self, sha: str) -> Optional[str]:
+        """Путь к содержимому на диске (для потоковой отправки) или None."""
+        if not self._valid(sha):
+            return None
+        try:
+            path = await asyncio.to_thread(self._disk_touch, sha)
+        except OSError as e:
+            log.warning("Blob cache: disk read failed for %s: %s", sha, e)
+            path = None
+        self.stats["disk_hits" if path else "misses"] += 1
+        return path
+
+    async def put_file(self, sha: str, tmp: str) -> str:
+        """
+        Кладёт на диск файл из temp_path(); содержимое в память не читается.
+        Только что добавленный и закреплённые (pin) файлы не вытесняются, даже если каталог
+        временно превысит лимит, — иначе вызывающий получил бы путь к удалённому файлу.
+        """
+        if not self._valid(sha):
+            raise ValueError(f"Bad blob sha: {sha}")
+        async with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = await asyncio.to_thread(self._disk_scan)
+            self._disk_bytes += await asyncio.to_thread(self._disk_adopt, sha, tmp)
+            if self._disk_bytes > self.disk_limit:
+                keep = {sha, *self._pins}
+                self._disk_bytes -= await asyncio.to_thread(self._disk_evict, self._disk_bytes - self.disk_limit, keep)
+        return self._path(sha)
+
+    @asynccontextmanager
+    async def pin(self, sha: str) -> AsyncIterator[None]:
+        """Пока открыт — файл sha не вытесняется (на время отправки через FSInputFile)."""
+        self._pins[sha] = self._pins.get(sha, 0) + 1
+        try:
+            yield
+        finally:
+            left = self._pins[sha] - 1
+            if left:
+                self._pins[sha] = left
+            else:
+                del self._pins[sha]
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            **self.stats,
+            "mem_items": len(self._mem),
+            "mem_bytes": self._mem_bytes,
+            "disk_bytes": self._disk_bytes or 0,
+        }
@@ -0,0 +1,53 @@
+# chunked.py — отправка длинного текста несколькими сообщениями (лимит Telegram — 4096 символов)
+from typing import List
+
+from aiogram import types
+
+TG_TEXT_LIMIT = 4096
+
+def _cut_line(line: str, limit: int, markdown: bool) -> List[str]:
+    """Жёстко режет строку длиннее лимита; в Markdown незакрытый `код` закрывается и открывается заново."""
+    pieces: List[str] = []
+    size = limit - 1 if markdown else limit  # место под закрывающий `
+    while len(line) > limit:
+        piece, line = line[:size], line[size:]
+        if markdown and piece.count("`") % 2:
+            piece += "`"
+            line = "`" + line
+        pieces.append(piece)
+    pieces.append(line)
+    return pieces
+
+def split_chunks(text: str, limit: int = TG_TEXT_LIMIT, *, markdown: bool = False) -> List[str]:
+    """Режет текст по границам строк; строка длиннее лимита режется жёстко."""
+    chunks: List[str] = []
+    cur = ""
+    for line in text.split("\n"):
+        if len(line) > limit:
+            *full, line = _cut_line(line, limit, markdown)
+            if cur:
+                chunks.append(cur)
+                cur = ""
+            chunks.extend(full)
+        if not cur:
+            cur = line
+        elif len(cur) + 1 + len(line) <= limit:
+            cur += "\n" + line
+        else:
+            chunks.append(cur)
+            cur = line
+    if cur or not chunks:
+        chunks.append(cur)
+    return chunks
+
+async def answer_chunked(message: types.Message, text: str, *, reply: bool = False, **kwargs) -> None:
+    """
+    message.answer / message.reply для текста любой длины.
+    reply_markup уходит только с последним куском, reply — только с первым.
+    """
+    markup = kwargs.pop("reply_markup", None)
+    chunks = split_chunks(text, markdown=kwargs.get("parse_mode") == "Markdown")
+    for i, chunk in enumerate(chunks):
+        last = i == len(chunks) - 1
+        send = message.reply if reply and i == 0 else message.answer
+        await send(chunk, reply_markup=markup if last else None, **kwargs)
@@ -1,6 +1,7 @@
 # db.py
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 
 MONGODB_URI = os.environ["MONGODB_URI"]
 MONGO_DB = os.environ.get("MONGO_DB", "telegram_bot")
@@ -11,12 +12,30 @@ db = _client[MONGO_DB]
 reminders = db["reminders"]
 notes = db["notes"]
 access = db["access"]  # хранит списки доступа, например {_id:"allowed", ids:[...int...]}
+counters = db["counters"]  # последовательности: {_id:"<имя>", seq:int}
+outbox = db["outbox"]  # очередь доставки: по документу на получателя
+dead_letters = db["dead_letters"]  # то, что доставить не удалось
+cron_runs = db["cron_runs"]  # прогоны /cron/due: статус и прогресс
+groups = db["groups"]  # адресаты напоминаний: {_id:"<имя>", members:[...int...]}
+doc_files = db["doc_files"]  # Telegram file_id документов: {_id:"<blob sha>", file_id, name}
+docs_snapshot = db["docs_snapshot"]  # последнее дерево документов: {_id:"tree", branch_sha, etag, tree}
+doc_text = db["doc_text"]  # извлечённый текст для /search: {_id:"<blob sha>", terms:{слово: частота}, text}
+
+# сколько хранить доставленные сообщения в outbox (журнал «что реально ушло»)
+OUTBOX_KEEP_SEC = int(os.environ.get("OUTBOX_KEEP_SEC", str(7 * 24 * 3600)))
+CRON_RUNS_KEEP_SEC = int(os.environ.get("CRON_RUNS_KEEP_SEC", str(3 * 24 * 3600)))
 
 async def ensure_indexes():
     await reminders.create_index([("when", 1)])
+    await reminders.create_index([("when", 1), ("_id", 1)])  # keyset-пагинация /reminders
     await reminders.create_index("id", unique=True, sparse=True)
     await notes.create_index([("user_id", 1), ("created_at", -1)])
-    # для access достаточно _id
+    await outbox.create_index([("status", 1), ("next_at", 1)])
+    await outbox.create_index("sent_at", expireAfterSeconds=OUTBOX_KEEP_SEC)
+    await dead_letters.create_index([("failed_at", -1)])
+    await cron_runs.create_index("started_at", expireAfterSeconds=CRON_RUNS_KEEP_SEC)
+    await groups.create_index("members")  # группы пользователя; сами группы ищутся по _id
+    # для access и counters достаточно _id
 
 # ===== Utilities for access control =====
 async def get_allowed_set() -> set[int]:
@@ -30,3 +49,39 @@ async def add_allowed(uid: int) -> None:
 
 async def remove_allowed(uid: int) -> None:
     await access.update_one({"_id": "allowed"}, {"$pull": {"ids": int(uid)}}, upsert=True)
+
+# ===== Groups (адресаты напоминаний) =====
+async def get_groups_members(names: list[str]) -> dict[str, set[int]]:
+    """Участники нескольких групп одним запросом; отсутствующие группы не попадают в ответ."""
+    out: dict[str, set[int]] = {}
+    async for doc in groups.find({"_id": {"$in": list(names)}}):
+        out[doc["_id"]] = {int(x) for x in doc.get("members", [])}
+    return out
+
+async def list_groups() -> dict[str, set[int]]:
+    return {doc["_id"]: {int(x) for x in doc.get("members", [])} async for doc in groups.find().sort("_id", 1)}
+
+async def add_group_members(name: str, uids: list[int]) -> None:
+    await groups.update_one({"_id": name}, {"$addToSet": {"members": {"$each": [int(x) for x in uids]}}}, upsert=True)
+
+async def remove_group_members(name: str, uids: list[int]) -> None:
+    await groups.update_one({"_id": name}, {"$pull": {"members": {"$in": [int(x) for x in uids]}}})
+
+async def delete_group(name: str) -> bool:
+    res = await groups.delete_one({"_id": name})
+    return res.deleted_count == 1
+
+# ===== Sequences =====
+async def next_seq(name: str) -> int:
+    """Атомарно выдаёт следующее число последовательности (0, 1, 2, ...) за один запрос."""
+    doc = await counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(doc["seq"]) - 1
+
+async def advance_seq(name: str, value: int) -> None:
+    """Гарантирует, что next_seq выдаст не меньше value (счётчик только растёт)."""
+    await counters.update_one({"_id": name}, {"$max": {"seq": int(value)}}, upsert=True)
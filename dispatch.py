@@ -0,0 +1,139 @@
+# dispatch.py — параллельная рассылка в Telegram с ограничением скорости (token bucket)
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from aiogram.exceptions import TelegramRetryAfter
+
+log = logging.getLogger("dispatch")
+
+# =========================
+#        НАСТРОЙКИ
+# =========================
+DISPATCH_WORKERS = int(os.environ.get("DISPATCH_WORKERS", "8"))            # размер пула отправителей
+TG_GLOBAL_RATE = float(os.environ.get("TG_GLOBAL_RATE", "25"))             # сообщений/сек на бота (лимит Telegram ~30)
+TG_CHAT_RATE = float(os.environ.get("TG_CHAT_RATE", "1"))                  # сообщений/сек в один чат
+DISPATCH_MAX_RETRIES = int(os.environ.get("DISPATCH_MAX_RETRIES", "3"))    # повторов после RetryAfter
+
+# =========================
+#      TOKEN BUCKET
+# =========================
+class TokenBucket:
+    """Ведро токенов: `rate` токенов в секунду, не больше `capacity` про запас."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(rate, 0.01)
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+        self._ts = now
+
+    async def acquire(self) -> None:
+        # лок даёт честную очередь: ждущие получают токены по порядку
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Не выдавать токены `seconds` секунд (после 429 от Telegram)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    @property
+    def idle(self) -> bool:
+        now = time.monotonic()
+        return not self._lock.locked() and self._tokens + (now - self._ts) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """Глобальный лимит бота + отдельное ведро на каждый чат."""
+
+    def __init__(self, global_rate: float, chat_rate: float):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self._chats: Dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        b = self._chats.get(chat_id)
+        if b is None:
+            if len(self._chats) > 1000:
+                # выкидываем полные (давно не использованные) вёдра, чтобы словарь не рос бесконечно
+                for cid in [c for c, v in self._chats.items() if v.idle]:
+                    self._chats.pop(cid, None)
+            b = self._chats[chat_id] = TokenBucket(self.chat_rate)
+        return b
+
+    async def acquire(self, chat_id: int) -> None:
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    def pause(self, seconds: float) -> None:
+        self.global_bucket.pause(seconds)
+
+
+# Лимиты Telegram — на бота, поэтому лимитер общий для всех прогонов в процессе
+limiter = RateLimiter(TG_GLOBAL_RATE, TG_CHAT_RATE)
+
+# =========================
+#        ОТПРАВКА
+# =========================
+async def send_with_retry(bot, chat_id: int, text: str, **kwargs) -> None:
+    """Отправляет сообщение с учётом лимитов; на TelegramRetryAfter ждёт и повторяет."""
+    attempt = 0
+    while True:
+        await limiter.acquire(chat_id)
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return
+        except TelegramRetryAfter as e:
+            attempt += 1
+            if attempt > DISPATCH_MAX_RETRIES:
+                raise
+            log.warning("Dispatch: flood control for %s, retry after %ss (attempt %d)", chat_id, e.retry_after, attempt)
+            limiter.pause(e.retry_after)
+            await asyncio.sleep(e.retry_after)
+
+
+async def send_many(bot, jobs: Sequence[Tuple[int, str]], *, workers: int = DISPATCH_WORKERS) -> List[Optional[Exception]]:
+    """
+    Рассылает пары (chat_id, text) пулом из `workers` корутин.
+    Возвращает список той же длины: None — доставлено, иначе исключение.
+    """
+    results: List[Optional[Exception]] = [None] * len(jobs)
+    if not jobs:
+        return results
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(len(jobs)):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            chat_id, text = jobs[i]
+            try:
+                await send_with_retry(bot, chat_id, text)
+            except Exception as e:
+                log.warning("Dispatch: failed to send to %s: %s", chat_id, e)
+                results[i] = e
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(jobs))))))
+    return results
@@ -1,18 +1,32 @@
 # docs.py — GitHub Docs (Trees API + cache) с короткими callback-токенами
 import os
+import json
 import time
-import secrets
+import asyncio
+import hmac
+import base64
+import hashlib
 import logging
-from typing import List, Tuple, Optional, Dict, Any, Set
+import tempfile
+from contextlib import asynccontextmanager
+from typing import List, Tuple, Optional, Dict, Any, Set, Callable, Awaitable, AsyncIterator
 
 import aiohttp
 from aiogram import types, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import StateFilter, Command
 from aiogram.types import (
     ReplyKeyboardMarkup, KeyboardButton,
-    InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, BufferedInputFile
+    InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, BufferedInputFile, FSInputFile,
+    InlineQuery, InlineQueryResultCachedDocument, InlineQueryResultsButton,
 )
 
+from db import doc_files, doc_text, docs_snapshot
+from blobcache import BlobCache
+from chunked import answer_chunked
+from docs_sources import DocsSource, LocalSource
+from docsearch import NameIndex, FullTextIndex, FULLTEXT_EXTS, FULLTEXT_KEEP, extract_text, term_counts
+
 log = logging.getLogger("docs")
 
 # =========================
@@ -23,6 +37,18 @@ GH_BRANCH = os.environ.get("GH_BRANCH", "main").strip()
 GH_DOCS_PATH = os.environ.get("GH_DOCS_PATH", "docs").strip().strip("/")
 GH_TOKEN = os.environ.get("GH_TOKEN", "").strip()
 GH_CACHE_TTL = int(os.environ.get("GH_CACHE_TTL", "600"))  # сек: 600 = 10 минут
+GH_HTTP_LIMIT = int(os.environ.get("GH_HTTP_LIMIT", "8"))  # соединений к api.github.com одновременно
+
+# Источник документов: github (Trees API) | local (каталог на диске, путь внутри — тот же GH_DOCS_PATH)
+DOCS_BACKEND = os.environ.get("DOCS_BACKEND", "github").strip().lower()
+DOCS_LOCAL_ROOT = os.environ.get("DOCS_LOCAL_ROOT", os.path.dirname(os.path.abspath(__file__)))
+
+# Кэш содержимого файлов (ключ — blob SHA)
+DOCS_CACHE_MEM_MB = int(os.environ.get("DOCS_CACHE_MEM_MB", "32"))
+DOCS_CACHE_DISK_MB = int(os.environ.get("DOCS_CACHE_DISK_MB", "256"))
+DOCS_CACHE_DIR = os.environ.get("DOCS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "postavka-blobs"))
+DOCS_CACHE_MEM_ITEM_KB = int(os.environ.get("DOCS_CACHE_MEM_ITEM_KB", "512"))  # крупнее — только диск
+DOCS_MAX_TRANSFERS = int(os.environ.get("DOCS_MAX_TRANSFERS", "2"))  # одновременных скачиваний с GitHub
 
 # Разрешённые расширения (в нижнем регистре, без точки)
 ALLOWED_EXTS: Set[str] = {"pdf", "doc", "docx", "xls", "xlsx", "csv", "txt", "jpg", "jpeg", "png"}
@@ -59,52 +85,137 @@ def _headers(kind: str = "json") -> dict:
     return h
 
 def _require_repo() -> Optional[str]:
+    if DOCS_BACKEND == "local":
+        return None
     if not GH_REPO or "/" not in GH_REPO:
         return "❗️GitHub не настроен. Укажи переменные: GH_REPO=owner/repo, GH_DOCS_PATH (и GH_TOKEN для приватного репо)."
     return None
 
+# =========================
+#   HTTP-СЕССИЯ (одна на процесс)
+# =========================
+# Keep-alive + DNS-кэш: повторные запросы к api.github.com идут без нового TLS-рукопожатия.
+_session: Optional[aiohttp.ClientSession] = None
+
+def _get_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=GH_HTTP_LIMIT,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
+async def start_http() -> None:
+    _get_session()
+
+async def close_http() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+_JSON_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10)
+_BYTES_TIMEOUT = aiohttp.ClientTimeout(total=60, connect=10)
+
+# =========================
+#   SINGLE-FLIGHT
+# =========================
+# Одновременные вызовы с одним ключом ждут один и тот же запрос, а не шлют свои.
+_INFLIGHT: Dict[str, asyncio.Future] = {}
+
+def _inflight_done(key: str, fut: asyncio.Future) -> None:
+    _INFLIGHT.pop(key, None)
+    if not fut.cancelled():
+        fut.exception()  # помечаем ошибку полученной, даже если все ждущие ушли
+
+async def _single_flight(key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    fut = _INFLIGHT.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(factory())
+        _INFLIGHT[key] = fut
+        fut.add_done_callback(lambda f: _inflight_done(key, f))
+    # shield: отмена одного ждущего не отменяет общий запрос
+    return await asyncio.shield(fut)
+
 # =========================
 #   КЭШ ДЕРЕВА РЕПО
 # =========================
-# TREE_CACHE = {"expires": <ts>, "branch_sha": "<sha>", "tree": [ {type, path, sha}, ... ]}
+# TREE_CACHE = {"expires": <ts>, "branch_sha": "<sha>", "etag": "<etag ветки>", "tree": [ {type, path, sha, size}, ... ],
+#               + индексы из _build_indexes}
+# Протухший кэш продолжает отдаваться, пока фоновая задача его перепроверяет (stale-while-revalidate).
 TREE_CACHE: Dict[str, Any] = {}
+GH_RETRY_AFTER_ERROR = 60  # сек: после ошибки перепроверки не долбим GitHub на каждом нажатии
+_gh_backoff_until = 0.0  # до этого момента фоновые задачи к GitHub не ходят
 
-async def _gh_json(url: str, kind: str = "json") -> Any:
-    async with aiohttp.ClientSession() as sess:
-        async with sess.get(url, headers=_headers(kind), timeout=30) as resp:
-            text = await resp.text()
-            if resp.status == 403 and "rate limit" in text.lower():
-                raise RuntimeError(f"GitHub 403 rate limit: {text}")
-            if resp.status != 200:
-                raise RuntimeError(f"GitHub error {resp.status}: {text}")
-            if kind == "json":
-                import json
-                return json.loads(text)
-            else:
-                return text.encode()
-
-async def _gh_bytes(url: str) -> bytes:
-    async with aiohttp.ClientSession() as sess:
-        async with sess.get(url, headers=_headers("raw"), timeout=60) as resp:
+def _gh_backoff() -> None:
+    global _gh_backoff_until
+    _gh_backoff_until = time.time() + GH_RETRY_AFTER_ERROR
+
+async def _gh_json(url: str) -> Any:
+    data, _ = await _gh_get(url)
+    return data
+
+async def _gh_conditional(url: str, etag: str) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    GET с If-None-Match (пустой etag — «ещё нет»): (data | None при 304, etag ответа).
+    304 не расходует лимит запросов GitHub.
+    """
+    return await _gh_get(url, etag)
+
+async def _gh_get(url: str, etag: str = "") -> Tuple[Optional[Any], Optional[str]]:
+    headers = _headers("json")
+    if etag:
+        headers["If-None-Match"] = etag
+    async with _get_session().get(url, headers=headers, timeout=_JSON_TIMEOUT) as resp:
+        if etag and resp.status == 304:
+            return None, etag
+        text = await resp.text()
+        if resp.status == 403 and "rate limit" in text.lower():
+            raise RuntimeError(f"GitHub 403 rate limit: {text}")
+        if resp.status != 200:
+            raise RuntimeError(f"GitHub error {resp.status}: {text}")
+        return json.loads(text), resp.headers.get("ETag")
+
+_TRANSFERS = asyncio.Semaphore(DOCS_MAX_TRANSFERS)
+_CHUNK = 64 * 1024
+
+async def _gh_download(url: str, dest: str) -> int:
+    """Скачивает тело ответа в файл кусками по 64 КБ — память не зависит от размера файла."""
+    async with _TRANSFERS:
+        async with _get_session().get(url, headers=_headers("raw"), timeout=_BYTES_TIMEOUT) as resp:
             if resp.status == 403:
                 t = await resp.text()
                 raise RuntimeError(f"GitHub 403: {t}")
             if resp.status != 200:
                 t = await resp.text()
                 raise RuntimeError(f"GitHub error {resp.status}: {t}")
-            return await resp.read()
+            size = 0
+            f = await asyncio.to_thread(open, dest, "wb")
+            try:
+                async for chunk in resp.content.iter_chunked(_CHUNK):
+                    await asyncio.to_thread(f.write, chunk)  # диск — не в цикле событий, как в blobcache
+                    size += len(chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            return size
 
-async def _get_branch_commit_sha() -> str:
+async def _get_branch_commit_sha(etag: str = "") -> Tuple[Optional[str], Optional[str]]:
+    """(sha коммита | None, если ветка не менялась с etag; новый etag)."""
     url = f"https://api.github.com/repos/{GH_REPO}/branches/{GH_BRANCH}"
-    data = await _gh_json(url, "json")
+    data, new_etag = await _gh_conditional(url, etag)
+    if data is None:
+        return None, new_etag
     sha = data.get("commit", {}).get("sha")
     if not sha:
         raise RuntimeError("No commit sha for branch")
-    return sha
+    return sha, new_etag
 
 async def _get_tree_recursive(commit_sha: str) -> List[Dict[str, Any]]:
     url = f"https://api.github.com/repos/{GH_REPO}/git/trees/{commit_sha}?recursive=1"
-    data = await _gh_json(url, "json")
+    data = await _gh_json(url)
     tree = data.get("tree", [])
     norm = []
     for it in tree:
@@ -113,108 +224,447 @@ async def _get_tree_recursive(commit_sha: str) -> List[Dict[str, Any]]:
         sha = it.get("sha")
         if not (t and p and sha):
             continue
-        norm.append({"type": t, "path": p, "sha": sha})
+        norm.append({"type": t, "path": p, "sha": sha, "size": it.get("size", 0)})
     return norm
 
-async def ensure_tree_cache(force: bool = False) -> None:
+class GitHubSource(DocsSource):
+    """Репозиторий на GitHub: ревизия — SHA коммита ветки, содержимое — по blob SHA (с кэшем)."""
+    name = "github"
+
+    async def head(self, etag: str = "") -> Tuple[Optional[str], Optional[str]]:
+        return await _get_branch_commit_sha(etag)
+
+    async def tree(self, revision: str) -> List[Dict[str, Any]]:
+        return await _get_tree_recursive(revision)
+
+    async def read(self, path: str, sha: str) -> bytes:
+        return await gh_get_file_bytes_by_blob_sha(sha)
+
+    @asynccontextmanager
+    async def open_file(self, path: str, sha: str) -> AsyncIterator[Optional[str]]:
+        async with BLOB_CACHE.pin(sha):
+            yield await gh_blob_file(sha)
+
+SOURCE: DocsSource = LocalSource(DOCS_LOCAL_ROOT, GH_DOCS_PATH) if DOCS_BACKEND == "local" else GitHubSource()
+
+async def _refresh_tree() -> None:
     now = time.time()
-    if not force and TREE_CACHE and TREE_CACHE.get("expires", 0) > now:
+    commit_sha, etag = await SOURCE.head(TREE_CACHE.get("etag", ""))
+    if TREE_CACHE and (commit_sha is None or commit_sha == TREE_CACHE.get("branch_sha")):
+        # ветка не менялась — дерево не тянем
+        TREE_CACHE["expires"] = now + GH_CACHE_TTL
+        TREE_CACHE["etag"] = etag
+        log.debug("Docs: tree cache revalidated (%s)", "304" if commit_sha is None else "same sha")
+        if _fulltext_incomplete:
+            _schedule_fulltext()  # индексация прерывалась из-за ошибок GitHub — продолжим
         return
-    commit_sha = await _get_branch_commit_sha()
-    tree = await _get_tree_recursive(commit_sha)
+    if commit_sha is None:
+        # 304 без дерева в памяти (не должно случаться) — повторим без etag
+        commit_sha, etag = await SOURCE.head()
+    tree = await SOURCE.tree(commit_sha)
+    _install_tree(tree, commit_sha, etag, now + GH_CACHE_TTL)
+    log.info("Docs: %s tree cache refreshed, %d entries", SOURCE.name, len(tree))
+    await _save_snapshot()
+
+def _install_tree(tree: List[Dict[str, Any]], branch_sha: str, etag: Optional[str], expires: float) -> None:
     TREE_CACHE.clear()
+    _KB_CACHE.clear()
     TREE_CACHE.update({
-        "expires": now + GH_CACHE_TTL,
-        "branch_sha": commit_sha,
+        "expires": expires,
+        "branch_sha": branch_sha,
+        "etag": etag,
         "tree": tree,
+        **_build_indexes(tree),
     })
-    log.info("Docs: tree cache refreshed, %d entries", len(tree))
+    _sync_name_index(TREE_CACHE["paths"])
+    _schedule_fulltext()
 
-def _list_from_tree(current_path: str) -> Tuple[List[str], List[str]]:
-    current_path = current_path.strip("/")
-    prefix = f"{current_path}/" if current_path else ""
-    tree = TREE_CACHE.get("tree", [])
-    dir_set: Set[str] = set()
-    file_list: List[str] = []
+# Снимок дерева в Mongo: после сна/рестарта инстанса меню открывается сразу из него,
+# а свежесть проверяется в фоне. Индексы не храним — они строятся из дерева за миллисекунды.
+async def _save_snapshot() -> None:
+    if not SOURCE.remote:
+        return
+    try:
+        await docs_snapshot.replace_one({"_id": "tree"}, {
+            "repo": GH_REPO,
+            "branch": GH_BRANCH,
+            "branch_sha": TREE_CACHE["branch_sha"],
+            "etag": TREE_CACHE.get("etag"),
+            "tree": TREE_CACHE["tree"],
+            "saved_at": time.time(),
+        }, upsert=True)
+    except Exception as e:
+        log.warning("Docs: cannot save tree snapshot: %s", e)
+
+async def prewarm() -> None:
+    """На старте: поднять снимок (как протухший кэш) и перепроверить его в фоне."""
+    global _revalidate_task
+    if _require_repo() or TREE_CACHE:
+        return
+    snap = None
+    try:
+        if SOURCE.remote:
+            snap = await docs_snapshot.find_one({"_id": "tree"})
+    except Exception as e:
+        log.warning("Docs: cannot load tree snapshot: %s", e)
+    if snap and snap.get("repo") == GH_REPO and snap.get("branch") == GH_BRANCH and snap.get("tree"):
+        _install_tree(snap["tree"], snap["branch_sha"], snap.get("etag"), 0)
+        log.info("Docs: tree restored from snapshot, %d entries", len(snap["tree"]))
+    _revalidate_task = asyncio.create_task(_revalidate())
+    try:
+        await _load_file_ids()
+    except Exception as e:
+        log.warning("Docs: cannot load file_id cache: %s", e)
+
+_revalidate_task: Optional[asyncio.Task] = None
+
+async def _revalidate() -> None:
+    try:
+        await _single_flight("tree", _refresh_tree)
+    except Exception as e:
+        log.warning("Docs: background tree refresh failed: %s", e)
+        _gh_backoff()
+        if TREE_CACHE:
+            TREE_CACHE["expires"] = time.time() + min(GH_RETRY_AFTER_ERROR, GH_CACHE_TTL)
+
+async def ensure_tree_cache(force: bool = False) -> None:
+    """
+    Пустой кэш (или force) — ждём загрузки. Протухший — сразу отдаём старое дерево,
+    а перепроверку запускаем в фоне (не больше одной одновременно).
+    """
+    global _revalidate_task
+    if force or not TREE_CACHE:
+        await _single_flight("tree", _refresh_tree)
+        return
+    if TREE_CACHE.get("expires", 0) <= time.time() and (_revalidate_task is None or _revalidate_task.done()):
+        _revalidate_task = asyncio.create_task(_revalidate())
+
+# =========================
+#   ИНДЕКСЫ ДЕРЕВА
+# =========================
+# Строятся один раз на версию дерева (при обновлении кэша), дальше навигация и поиск — O(1).
+#   listing: папка -> (отсортированные подпапки, отсортированные разрешённые файлы)
+#   paths:   путь файла -> blob sha
+#   by_name: имя файла в нижнем регистре -> [пути]
+#   tokens:  callback-токен -> путь (см. _token_for_path)
+
+def _build_indexes(tree: List[Dict[str, Any]]) -> Dict[str, Any]:
+    dirs: Dict[str, Set[str]] = {}
+    files: Dict[str, List[str]] = {}
+    paths: Dict[str, str] = {}
+    by_name: Dict[str, List[str]] = {}
+    seen: Set[str] = set()
 
     for it in tree:
         path = it["path"]
-        if not path.startswith(prefix):
+        parent, _, name = path.rpartition("/")
+        if it["type"] == "blob":
+            paths[path] = it["sha"]
+            if _is_allowed(name):
+                files.setdefault(parent, []).append(name)
+                by_name.setdefault(name.lower(), []).append(path)
+        # папка видна в родителе, если в ней хоть что-то есть — регистрируем цепочку предков
+        while parent and parent not in seen:
+            seen.add(parent)
+            grand, _, dname = parent.rpartition("/")
+            dirs.setdefault(grand, set()).add(dname)
+            parent = grand
+
+    listing = {
+        p: (sorted(dirs.get(p, ()), key=str.lower), sorted(files.get(p, ()), key=str.lower))
+        for p in set(dirs) | set(files)
+    }
+    # кнопки бывают только у папок, разрешённых файлов и корней
+    tokens: Dict[str, str] = {}
+    for p in {"", GH_DOCS_PATH, *listing, *(q for qs in by_name.values() for q in qs)}:
+        tok = _token_for_path(p)
+        if tokens.setdefault(tok, p) != p:
+            log.warning("Docs: callback token collision: %s / %s", tokens[tok], p)
+    return {"listing": listing, "paths": paths, "by_name": by_name, "tokens": tokens}
+
+def _looks_like_doc_name(text: Any) -> bool:
+    """
+    Дешёвый фильтр для текстового поиска файла — без I/O: расширение из ALLOWED_EXTS
+    и (если дерево уже загружено) точное имя из индекса. «50000.5 ндс» сюда не проходит.
+    """
+    if not isinstance(text, str):
+        return False
+    name = text.strip()
+    if len(name) < 3 or not _is_allowed(name):
+        return False
+    by_name = TREE_CACHE.get("by_name")
+    if by_name is not None:
+        return name.lower() in by_name
+    return True  # дерева ещё нет — проверит сам хендлер
+
+# Нечёткий поиск по именам (/find); обновляется инкрементально при смене дерева
+NAME_INDEX = NameIndex()
+DOCS_FIND_LIMIT = int(os.environ.get("DOCS_FIND_LIMIT", "10"))
+# Inline-режим (@bot запрос): Telegram сам кэширует ответ на cache_time; запросы, набранные
+# быстрее DOCS_INLINE_DEBOUNCE, отбрасываются — отвечаем только на последний.
+DOCS_INLINE_CACHE_SEC = int(os.environ.get("DOCS_INLINE_CACHE_SEC", "300"))
+DOCS_INLINE_DEBOUNCE = float(os.environ.get("DOCS_INLINE_DEBOUNCE", "0.4"))
+DOCS_INLINE_LIMIT = 20
+_INLINE_SEQ: Dict[int, int] = {}  # user_id -> номер последнего inline-запроса
+
+def _docs_rel(path: str) -> str:
+    root = GH_DOCS_PATH or ""
+    return path[len(root) + 1:] if root and path.startswith(root + "/") else path
+
+def _sync_name_index(paths: Dict[str, str]) -> None:
+    prefix = f"{GH_DOCS_PATH}/" if GH_DOCS_PATH else ""
+    added, removed = NAME_INDEX.sync(p for p in paths if p.startswith(prefix) and _is_allowed(p))
+    if added or removed:
+        log.info("Docs: name index +%d -%d (%d total)", added, removed, len(NAME_INDEX))
+
+# Полнотекстовый поиск (/search) по docx/txt/csv. Текст извлекается в фоне после смены дерева
+# и сохраняется в doc_text по blob SHA — после рестарта заново качаются только новые файлы.
+FULLTEXT = FullTextIndex()
+DOCS_SEARCH_MAX_MB = int(os.environ.get("DOCS_SEARCH_MAX_MB", "5"))  # файлы крупнее не индексируем
+# Индексатор качает по одному файлу с паузой и уступает _TRANSFERS пользовательским скачиваниям,
+# чтобы не съесть лимит GitHub, нужный /docs
+DOCS_INDEX_PAUSE_SEC = float(os.environ.get("DOCS_INDEX_PAUSE_SEC", "1"))
+_fulltext_task: Optional[asyncio.Task] = None
+_fulltext_again = False
+_fulltext_incomplete = False
+
+def _schedule_fulltext() -> None:
+    """Запускает индексацию; если она уже идёт — просит пройти ещё раз по свежему дереву."""
+    global _fulltext_task, _fulltext_again
+    if _fulltext_task is not None and not _fulltext_task.done():
+        _fulltext_again = True
+        return
+    _fulltext_task = asyncio.create_task(_fulltext_worker())
+
+async def _fulltext_worker() -> None:
+    global _fulltext_again
+    while True:
+        _fulltext_again = False
+        try:
+            await _index_fulltext()
+        except Exception:
+            log.exception("Docs: full-text indexing failed")
+        if not _fulltext_again:
+            return
+
+async def _index_fulltext() -> None:
+    prefix = f"{GH_DOCS_PATH}/" if GH_DOCS_PATH else ""
+    sizes = {it["sha"]: it.get("size") for it in TREE_CACHE.get("tree", []) if it["type"] == "blob"}
+    paths: Dict[str, List[str]] = {}
+    for path, sha in TREE_CACHE.get("paths", {}).items():
+        if path.startswith(prefix) and path.rsplit(".", 1)[-1].lower() in FULLTEXT_EXTS:
+            paths.setdefault(sha, []).append(path)
+    FULLTEXT.retain(set(paths))
+    FULLTEXT.paths = paths
+
+    missing = [sha for sha in paths if sha not in FULLTEXT]
+    if missing:
+        async for row in doc_text.find({"_id": {"$in": missing}}):
+            FULLTEXT.add(row["_id"], row.get("terms", {}), row.get("text", ""))
+    global _fulltext_incomplete
+    _fulltext_incomplete = False
+    fresh = 0
+    for sha in missing:
+        if sha in FULLTEXT:
             continue
-        rest = path[len(prefix):]
-        if "/" in rest:
-            dir_set.add(rest.split("/", 1)[0])
-        else:
-            if it["type"] == "blob" and _is_allowed(rest):
-                file_list.append(rest)
+        if (sizes.get(sha) or 0) > DOCS_SEARCH_MAX_MB * 1024 * 1024:
+            continue
+        path = paths[sha][0]
+        if SOURCE.remote:
+            if time.time() < _gh_backoff_until:
+                log.info("Docs: full-text indexing paused, GitHub backoff active")
+                _fulltext_incomplete = True
+                break
+            while _TRANSFERS.locked():  # все слоты заняты — пропускаем пользователей вперёд
+                await asyncio.sleep(DOCS_INDEX_PAUSE_SEC)
+        try:
+            raw = await SOURCE.read(path, sha)
+        except Exception as e:
+            log.warning("Docs: cannot fetch %s for indexing: %s", path, e)
+            if SOURCE.remote:
+                _gh_backoff()
+                _fulltext_incomplete = True
+                break
+            continue
+        try:
+            text = await asyncio.to_thread(extract_text, path, raw)
+        except Exception as e:
+            log.warning("Docs: cannot index %s: %s", path, e)
+            continue
+        terms = term_counts(text)
+        FULLTEXT.add(sha, terms, text)
+        await doc_text.update_one({"_id": sha}, {"$set": {"terms": terms, "text": text[:FULLTEXT_KEEP]}}, upsert=True)
+        fresh += 1
+        if SOURCE.remote:
+            await asyncio.sleep(DOCS_INDEX_PAUSE_SEC)
+    log.info("Docs: full-text index %d docs (%d extracted)", len(FULLTEXT), fresh)
 
-    return sorted(dir_set, key=str.lower), sorted(file_list, key=str.lower)
+def _list_from_tree(current_path: str) -> Tuple[List[str], List[str]]:
+    return TREE_CACHE.get("listing", {}).get(current_path.strip("/"), ([], []))
 
 def _find_blob_sha(full_path: str) -> Optional[str]:
-    full_path = full_path.strip("/")
-    for it in TREE_CACHE.get("tree", []):
-        if it["type"] == "blob" and it["path"] == full_path:
-            return it["sha"]
-    return None
+    return TREE_CACHE.get("paths", {}).get(full_path.strip("/"))
+
+BLOB_CACHE = BlobCache(
+    DOCS_CACHE_MEM_MB * 1024 * 1024, DOCS_CACHE_DIR, DOCS_CACHE_DISK_MB * 1024 * 1024,
+    mem_item_limit=DOCS_CACHE_MEM_ITEM_KB * 1024,
+)
+
+async def gh_blob_file(blob_sha: str) -> str:
+    """
+    Путь к blob в дисковом кэше; при промахе — потоковое скачивание (одно на SHA).
+    Вызывать внутри BLOB_CACHE.pin(blob_sha), пока путь нужен.
+    """
+    path = await BLOB_CACHE.file(blob_sha)
+    if path:
+        return path
+    return await _single_flight(f"blob:{blob_sha}", lambda: _download_blob(blob_sha))
 
 async def gh_get_file_bytes_by_blob_sha(blob_sha: str) -> bytes:
+    data = await BLOB_CACHE.get(blob_sha)  # память и диск; промах учтён здесь один раз
+    if data is not None:
+        return data
+    async with BLOB_CACHE.pin(blob_sha):
+        await _single_flight(f"blob:{blob_sha}", lambda: _download_blob(blob_sha))
+        data = await BLOB_CACHE.get(blob_sha, count=False)
+    if data is None:
+        raise RuntimeError(f"Blob {blob_sha} vanished from the docs cache")
+    return data
+
+async def _download_blob(blob_sha: str) -> str:
     url = f"https://api.github.com/repos/{GH_REPO}/git/blobs/{blob_sha}"
-    return await _gh_bytes(url)
+    tmp = BLOB_CACHE.temp_path()
+    try:
+        await _gh_download(url, tmp)
+        return await BLOB_CACHE.put_file(blob_sha, tmp)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+# =========================
+#  FILE_ID УЖЕ ЗАГРУЖЕННЫХ
+# =========================
+# После первой загрузки Telegram отдаёт file_id — дальше шлём по нему, без GitHub и без upload.
+# Ключ — blob SHA: изменился файл -> новый SHA -> промах, старая запись просто не используется.
+_FILE_IDS: Dict[str, Dict[str, str]] = {}  # sha -> {"file_id", "name"} (зеркало doc_files)
+
+async def _load_file_ids() -> None:
+    """Все известные file_id в память: inline-поиск отвечает без запросов к Mongo."""
+    async for row in doc_files.find():
+        _FILE_IDS[row["_id"]] = {"file_id": row.get("file_id"), "name": row.get("name")}
+    log.info("Docs: %d file_ids loaded", len(_FILE_IDS))
+
+def _known_file_id(sha: str, name: str) -> Optional[str]:
+    row = _FILE_IDS.get(sha)
+    return row.get("file_id") if row and row.get("name") == name else None
+
+async def _cached_file_id(sha: str, name: str) -> Optional[str]:
+    row = _FILE_IDS.get(sha)
+    if row is None:
+        row = await doc_files.find_one({"_id": sha})
+        if row:
+            _FILE_IDS[sha] = row
+    # одинаковое содержимое под другим именем — file_id принёс бы чужое имя файла
+    if row and row.get("name") == name:
+        return row.get("file_id")
+    return None
+
+async def _remember_file_id(sha: str, name: str, file_id: str) -> None:
+    row = {"file_id": file_id, "name": name}
+    _FILE_IDS[sha] = row
+    await doc_files.update_one({"_id": sha}, {"$set": row}, upsert=True)
+
+async def _forget_file_id(sha: str) -> None:
+    _FILE_IDS.pop(sha, None)
+    await doc_files.delete_one({"_id": sha})
+
+async def send_doc(message: types.Message, path: str, sha: str) -> None:
+    name = path.rsplit("/", 1)[-1]
+    caption = f"📁 {name}"
+    file_id = await _cached_file_id(sha, name)
+    if file_id:
+        try:
+            await message.answer_document(file_id, caption=caption)
+            return
+        except TelegramBadRequest as e:
+            log.warning("Docs: cached file_id for %s rejected (%s), re-uploading", path, e)
+            await _forget_file_id(sha)
+
+    async with SOURCE.open_file(path, sha) as local:
+        if local:
+            doc = FSInputFile(local, filename=name)  # aiogram читает файл потоком при загрузке
+        else:
+            doc = BufferedInputFile(await SOURCE.read(path, sha), filename=name)
+        sent = await message.answer_document(doc, caption=caption)
+    if sent.document:
+        await _remember_file_id(sha, name, sent.document.file_id)
+
+def _send_error_text(path: str, e: Exception) -> str:
+    fallback = f"https://raw.githubusercontent.com/{GH_REPO}/{GH_BRANCH}/{path}"
+    msg = f"Не удалось отправить файл: {e}"
+    if not SOURCE.remote:
+        return msg
+    if GH_TOKEN:
+        msg += "\n(Файл может быть приватным; прямая ссылка без токена не откроется.)"
+    else:
+        msg += f"\nЕсли репозиторий публичный, попробуйте ссылку: {fallback}"
+    return msg
 
 # =========================
 #  КОРОТКИЕ CALLBACK DATA
 # =========================
 # Telegram ограничивает callback_data 1..64 байт.
-# Делаем токены fixed-size, а пути храним в памяти.
-DOCS_TOKEN_TTL = int(os.environ.get("DOCS_TOKEN_TTL", "900"))  # 15 минут
-_TOKEN_MAP: Dict[str, Dict[str, Any]] = {}  # token -> {"path": str, "ts": float}
-
-def _cleanup_tokens():
-    now = time.time()
-    dead = [t for t, v in _TOKEN_MAP.items() if v.get("ts", 0) + DOCS_TOKEN_TTL < now]
-    for t in dead:
-        _TOKEN_MAP.pop(t, None)
-    if dead:
-        log.debug("Docs: cleaned %d expired tokens", len(dead))
+# Токен — усечённый HMAC пути: вычисляется детерминированно, а обратно разрешается через индекс
+# tokens (строится вместе с деревом). Памяти на пользователя не нужно, кнопки переживают рестарт
+# и одинаковы на всех репликах. DOCS_TOKEN_SECRET не даёт подобрать токен к пути вне меню.
+DOCS_TOKEN_SECRET = os.environ.get("DOCS_TOKEN_SECRET", "").encode()
 
 def _token_for_path(path: str) -> str:
-    """
-    Выдаёт короткий токен (<= 16 байт) и кладёт соответствие token->path в память.
-    """
-    _cleanup_tokens()
-    # 12 символов достаточно ( ~72 бита энтропии)
-    token = secrets.token_urlsafe(9)  # ~12 символов
-    _TOKEN_MAP[token] = {"path": path, "ts": time.time()}
-    return token
+    """12 символов base64url (72 бита) — с запасом для дерева документов."""
+    digest = hmac.new(DOCS_TOKEN_SECRET, path.strip("/").encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:9]).decode()
 
 def _path_from_token(token: str) -> Optional[str]:
-    row = _TOKEN_MAP.get(token)
-    if not row:
-        return None
-    if row["ts"] + DOCS_TOKEN_TTL < time.time():
-        _TOKEN_MAP.pop(token, None)
-        return None
-    # обновим таймштамп при обращении, чтобы не отваливалось во время навигации
-    row["ts"] = time.time()
-    return row["path"]
+    return TREE_CACHE.get("tokens", {}).get(token)
 
 # =========================
 #      UI helpers
 # =========================
 
-def _build_inline_for_path(path: str, dirs: List[str], files: List[str]) -> InlineKeyboardMarkup:
+# Большая папка листается страницами: кнопки строятся только для видимой страницы,
+# готовые клавиатуры кэшируются по (путь, страница, SHA дерева) — при смене дерева кэш сбрасывается.
+DOCS_PAGE_SIZE = max(int(os.environ.get("DOCS_PAGE_SIZE", "20")), 1)
+_KB_CACHE: Dict[Tuple[str, int, str], InlineKeyboardMarkup] = {}
+
+def _build_inline_for_path(path: str, dirs: List[str], files: List[str], page: int = 0) -> InlineKeyboardMarkup:
     buttons: List[List[InlineKeyboardButton]] = []
 
-    for d in dirs:
+    total = len(dirs) + len(files)
+    pages = max((total + DOCS_PAGE_SIZE - 1) // DOCS_PAGE_SIZE, 1)
+    page = min(max(page, 0), pages - 1)
+    lo, hi = page * DOCS_PAGE_SIZE, (page + 1) * DOCS_PAGE_SIZE
+
+    for d in dirs[lo:hi]:
         full = _join_path(path, d)
         tok = _token_for_path(full)
         buttons.append([InlineKeyboardButton(text=f"📁 {d}", callback_data=f"doc:d:{tok}")])
 
-    for f in files:
+    for f in files[max(lo - len(dirs), 0):max(hi - len(dirs), 0)]:
         full = _join_path(path, f)
         tok = _token_for_path(full)
         buttons.append([InlineKeyboardButton(text=f"📄 {f}", callback_data=f"doc:f:{tok}")])
 
+    if pages > 1:
+        tok_here = _token_for_path(path)
+        page_row: List[InlineKeyboardButton] = []
+        if page > 0:
+            page_row.append(InlineKeyboardButton(text="◀️", callback_data=f"doc:d:{tok_here}:{page - 1}"))
+        page_row.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="doc:n:"))
+        if page < pages - 1:
+            page_row.append(InlineKeyboardButton(text="▶️", callback_data=f"doc:d:{tok_here}:{page + 1}"))
+        buttons.append(page_row)
+
     parent = _parent_path(path)
     nav_row: List[InlineKeyboardButton] = []
     if parent != path:
@@ -233,12 +683,34 @@ def _build_inline_for_path(path: str, dirs: List[str], files: List[str]) -> Inli
         buttons = [[InlineKeyboardButton(text="🏠 Корень", callback_data=f"doc:d:{tok_home}")]]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
-async def _send_path_message(message: types.Message, path: str):
+def _keyboard_for_path(path: str, page: int = 0) -> InlineKeyboardMarkup:
     dirs, files = _list_from_tree(path)
-    kb = _build_inline_for_path(path, dirs, files)
+    pages = max((len(dirs) + len(files) + DOCS_PAGE_SIZE - 1) // DOCS_PAGE_SIZE, 1)
+    page = min(max(page, 0), pages - 1)  # номер из callback не должен раздувать кэш
+    key = (path, page, TREE_CACHE.get("branch_sha", ""))
+    kb = _KB_CACHE.get(key)
+    if kb is None:
+        kb = _KB_CACHE[key] = _build_inline_for_path(path, dirs, files, page)
+    return kb
+
+async def _send_path_message(message: types.Message, path: str):
+    kb = _keyboard_for_path(path)
     caption = f"Выбери документ или папку:\nПуть: /{path}" if path else "Выбери документ или папку:\nПуть: /"
     await message.answer(caption, reply_markup=kb)
 
+async def open_docs_root(message: types.Message) -> None:
+    """Корень документов (/docs и deep link `/start docs` из inline-режима); доступ проверяет вызывающий."""
+    err = _require_repo()
+    if err:
+        await message.answer(err, reply_markup=back_kb); return
+    try:
+        await ensure_tree_cache(force=False)
+    except Exception as e:
+        await message.answer(f"Ошибка GitHub: {e}", reply_markup=back_kb)
+        return
+    root = GH_DOCS_PATH or ""
+    await _send_path_message(message, root)
+
 # =========================
 #       HANDLERS
 # =========================
@@ -276,16 +748,7 @@ def register_docs_handlers(dp, is_authorized, refuse):
     async def docs_cmd(message: types.Message):
         if not is_authorized(message.from_user.id):
             await refuse(message); return
-        err = _require_repo()
-        if err:
-            await message.answer(err, reply_markup=back_kb); return
-        try:
-            await ensure_tree_cache(force=False)
-        except Exception as e:
-            await message.answer(f"Ошибка GitHub: {e}", reply_markup=back_kb)
-            return
-        root = GH_DOCS_PATH or ""
-        await _send_path_message(message, root)
+        await open_docs_root(message)
 
     @dp.callback_query(F.data.startswith("doc:"))
     async def on_doc_cb(cb: CallbackQuery):
@@ -293,34 +756,37 @@ def register_docs_handlers(dp, is_authorized, refuse):
             await cb.message.answer("⛔️ Доступ запрещён."); await cb.answer(); return
 
         try:
-            _, kind, token = cb.data.split(":", maxsplit=2)
+            _, kind, rest = cb.data.split(":", maxsplit=2)
         except ValueError:
             await cb.answer("Некорректные данные"); return
+        if kind == "n":  # счётчик страниц — просто надпись
+            await cb.answer(); return
+        token, _, page_s = rest.partition(":")
+        page = int(page_s) if page_s.isdigit() else 0
 
+        try:
+            await ensure_tree_cache(force=False)  # после рестарта индекс токенов ещё пуст
+        except Exception:
+            pass
         path = _path_from_token(token)
-        if not path:
-            # токен устарел — обновим кэш и вернёмся на корень
-            try:
-                await ensure_tree_cache(force=False)
-            except Exception:
-                pass
+        if path is None:
+            # пути больше нет в дереве (удалён или переименован) — вернёмся на корень
             home = GH_DOCS_PATH or ""
-            dirs, files = _list_from_tree(home)
-            kb = _build_inline_for_path(home, dirs, files)
-            await cb.message.edit_text("Ссылка устарела. Обновил список.\nПуть: /" + (home or ""))
-            await cb.message.edit_reply_markup(reply_markup=kb)
+            kb = _keyboard_for_path(home)
+            await cb.message.edit_text("Ссылка устарела. Обновил список.\nПуть: /" + (home or ""), reply_markup=kb)
             await cb.answer()
             return
 
         if kind == "d":
             try:
-                await ensure_tree_cache(force=False)
-                dirs, files = _list_from_tree(path)
-                kb = _build_inline_for_path(path, dirs, files)
+                kb = _keyboard_for_path(path, page)
                 caption = f"Выбери документ или папку:\nПуть: /{path}" if path else "Выбери документ или папку:\nПуть: /"
-                await cb.message.edit_text(caption)
-                await cb.message.edit_reply_markup(reply_markup=kb)
+                # текст и клавиатура одним запросом: при листании текст тот же, меняются кнопки
+                await cb.message.edit_text(caption, reply_markup=kb)
+                await cb.answer()
             except Exception as e:
+                if isinstance(e, TelegramBadRequest) and "not modified" in str(e).lower():
+                    await cb.answer(); return  # двойное нажатие
                 await cb.answer("Ошибка")
                 await cb.message.answer(f"Ошибка GitHub: {e}")
             return
@@ -331,49 +797,30 @@ def register_docs_handlers(dp, is_authorized, refuse):
                 sha = _find_blob_sha(path)
                 if not sha:
                     await cb.answer("Файл не найден"); return
-                raw = await gh_get_file_bytes_by_blob_sha(sha)
-                name = path.rsplit("/", 1)[-1]
-                await cb.message.answer_document(
-                    BufferedInputFile(raw, filename=name),
-                    caption=f"📁 {name}"
-                )
+                await send_doc(cb.message, path, sha)
             except Exception as e:
-                fallback = f"https://raw.githubusercontent.com/{GH_REPO}/{GH_BRANCH}/{path}"
-                msg = f"Не удалось отправить файл: {e}"
-                if GH_TOKEN:
-                    msg += "\n(Файл может быть приватным; прямая ссылка без токена не откроется.)"
-                else:
-                    msg += f"\nЕсли репозиторий публичный, попробуйте ссылку: {fallback}"
-                await cb.message.answer(msg)
+                await cb.message.answer(_send_error_text(path, e))
             finally:
                 await cb.answer()
             return
 
         await cb.answer("Неизвестное действие")
 
-    # Текстовый ввод имени файла — ищем в кэше и отдаём
-    @dp.message(StateFilter('*'), F.text.func(lambda s: isinstance(s, str) and "." in s))
+    # Текстовый ввод имени файла — ищем в кэше и отдаём.
+    # Только вне FSM-сценариев и только для текста, похожего на имя известного файла.
+    @dp.message(StateFilter(None), F.text.func(_looks_like_doc_name))
     async def docs_text_lookup(message: types.Message):
         if not is_authorized(message.from_user.id):
             await refuse(message); return
 
         name = (message.text or "").strip()
-        if len(name) < 3:
-            return
 
         try:
             await ensure_tree_cache(force=False)
         except Exception:
             return
 
-        matches: List[str] = []
-        low = name.lower()
-        for it in TREE_CACHE.get("tree", []):
-            if it["type"] != "blob":
-                continue
-            base = it["path"].rsplit("/", 1)[-1]
-            if base.lower() == low and _is_allowed(base):
-                matches.append(it["path"])
+        matches: List[str] = TREE_CACHE.get("by_name", {}).get(name.lower(), [])
 
         if not matches:
             return
@@ -392,17 +839,117 @@ def register_docs_handlers(dp, is_authorized, refuse):
         if not sha:
             await message.answer("Не удалось найти файл."); return
         try:
-            raw = await gh_get_file_bytes_by_blob_sha(sha)
-            fname = path.rsplit("/", 1)[-1]
-            await message.answer_document(BufferedInputFile(raw, filename=fname), caption=f"📁 {fname}")
+            await send_doc(message, path, sha)
         except Exception as e:
-            fallback = f"https://raw.githubusercontent.com/{GH_REPO}/{GH_BRANCH}/{path}"
-            msg = f"Не удалось отправить файл: {e}"
-            if GH_TOKEN:
-                msg += "\n(Файл может быть приватным; прямая ссылка без токена не откроется.)"
-            else:
-                msg += f"\nЕсли репозиторий публичный, попробуйте ссылку: {fallback}"
-            await message.answer(msg)
+            await message.answer(_send_error_text(path, e))
+
+    @dp.message(Command("find"))
+    async def docs_find(message: types.Message):
+        if not is_authorized(message.from_user.id):
+            await refuse(message); return
+        err = _require_repo()
+        if err:
+            await message.answer(err, reply_markup=back_kb); return
+        parts = (message.text or "").split(maxsplit=1)
+        if len(parts) < 2 or not parts[1].strip():
+            await message.answer("Использование: `/find часть названия`, например `/find бланк пп`", parse_mode="Markdown")
+            return
+        query = parts[1].strip()
+        try:
+            await ensure_tree_cache(force=False)
+        except Exception as e:
+            await message.answer(f"Ошибка GitHub: {e}", reply_markup=back_kb)
+            return
+
+        hits = NAME_INDEX.search(query, limit=DOCS_FIND_LIMIT)
+        if not hits:
+            await message.answer(f"По запросу «{query}» ничего не нашёл."); return
+        buttons = [
+            [InlineKeyboardButton(text=f"📄 {_docs_rel(p)}", callback_data=f"doc:f:{_token_for_path(p)}")]
+            for p, _ in hits
+        ]
+        await message.answer(f"Нашёл по запросу «{query}»:", reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+
+    @dp.message(Command("search"))
+    async def docs_search(message: types.Message):
+        if not is_authorized(message.from_user.id):
+            await refuse(message); return
+        err = _require_repo()
+        if err:
+            await message.answer(err, reply_markup=back_kb); return
+        parts = (message.text or "").split(maxsplit=1)
+        if len(parts) < 2 or not parts[1].strip():
+            await message.answer("Использование: `/search слова из текста`, например `/search срыв загрузки`", parse_mode="Markdown")
+            return
+        query = parts[1].strip()
+        try:
+            await ensure_tree_cache(force=False)
+        except Exception as e:
+            await message.answer(f"Ошибка GitHub: {e}", reply_markup=back_kb)
+            return
+
+        hits = [(FULLTEXT.paths[sha][0], snippet) for sha, _, snippet in FULLTEXT.search(query, limit=DOCS_FIND_LIMIT)
+                if FULLTEXT.paths.get(sha)]
+        if not hits:
+            note = " (индекс ещё строится, попробуй через минуту)" if _fulltext_task and not _fulltext_task.done() else ""
+            await message.answer(f"По запросу «{query}» в текстах ничего не нашёл{note}."); return
+        lines = [f"Нашёл в текстах по запросу «{query}»:"]
+        buttons = []
+        for i, (p, snippet) in enumerate(hits, 1):
+            lines.append(f"\n{i}. {_docs_rel(p)}\n{snippet}")
+            buttons.append([InlineKeyboardButton(text=f"{i}. 📄 {_docs_rel(p)}", callback_data=f"doc:f:{_token_for_path(p)}")])
+        await answer_chunked(message, "\n".join(lines), reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+
+    @dp.inline_query()
+    async def docs_inline(iq: InlineQuery):
+        if not is_authorized(iq.from_user.id):
+            await iq.answer([], cache_time=DOCS_INLINE_CACHE_SEC, is_personal=True); return
+
+        uid = iq.from_user.id
+        seq = _INLINE_SEQ.get(uid, 0) + 1
+        _INLINE_SEQ[uid] = seq
+        await asyncio.sleep(DOCS_INLINE_DEBOUNCE)
+        if _INLINE_SEQ.get(uid) != seq:
+            return  # пользователь продолжил печатать — ответим на следующий запрос
+        _INLINE_SEQ.pop(uid, None)
+
+        query = (iq.query or "").strip()
+        results = []
+        try:
+            await ensure_tree_cache(force=False)
+        except Exception as e:
+            log.warning("Docs: inline query without tree: %s", e)
+            query = ""
+        if query:
+            paths = TREE_CACHE.get("paths", {})
+            # в inline можно отдать только то, что Telegram уже видел (есть file_id)
+            for p, _ in NAME_INDEX.search(query, limit=DOCS_INLINE_LIMIT * 2):
+                name = p.rsplit("/", 1)[-1]
+                file_id = _known_file_id(paths.get(p, ""), name)
+                if not file_id:
+                    continue
+                results.append(InlineQueryResultCachedDocument(
+                    id=_token_for_path(p), title=name, document_file_id=file_id,
+                    description=_docs_rel(p).rpartition("/")[0] or None,
+                ))
+                if len(results) >= DOCS_INLINE_LIMIT:
+                    break
+        await iq.answer(
+            results, cache_time=DOCS_INLINE_CACHE_SEC, is_personal=True,
+            button=InlineQueryResultsButton(text="📁 Открыть все документы в боте", start_parameter="docs"),
+        )
+
+    @dp.message(Command("docs_cache"))
+    async def docs_cache_stats(message: types.Message):
+        if not is_authorized(message.from_user.id):
+            await refuse(message); return
+        st = BLOB_CACHE.snapshot()
+        await message.answer(
+            "Кэш документов:\n"
+            f"• память: {st['mem_items']} файлов, {st['mem_bytes'] // 1024} КБ, попаданий {st['mem_hits']}\n"
+            f"• диск: {st['disk_bytes'] // 1024} КБ, попаданий {st['disk_hits']}\n"
+            f"• промахов: {st['misses']}, вытеснено: {st['evictions']}"
+        )
 
     # «⬅️ В меню»
     @dp.message(StateFilter('*'), F.text == "⬅️ В меню")
@@ -0,0 +1,120 @@
+# docs_sources.py — источники документов: общий интерфейс и локальный каталог
+import os
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+log = logging.getLogger("docs_sources")
+
+
+class DocsSource(ABC):
+    """
+    Откуда берутся документы. Дерево — список {type: "blob"|"tree", path, sha, size}, как у
+    GitHub Trees API; sha — git blob SHA содержимого, на нём держатся кэши (file_id, текст, байты).
+    """
+    name = "base"  # для логов
+    remote = True  # дерево стоит сохранять в снимок (дорого получать после рестарта)
+
+    @abstractmethod
+    async def head(self, etag: str = "") -> Tuple[Optional[str], Optional[str]]:
+        """(ревизия | None, если не менялась с etag; новый etag)."""
+
+    @abstractmethod
+    async def tree(self, revision: str) -> List[Dict[str, Any]]:
+        """Всё дерево ревизии."""
+
+    @abstractmethod
+    async def read(self, path: str, sha: str) -> bytes:
+        """Содержимое файла целиком."""
+
+    @asynccontextmanager
+    async def open_file(self, path: str, sha: str) -> AsyncIterator[Optional[str]]:
+        """Путь на диске на время отправки (файл уйдёт потоком); None — отдавать через read()."""
+        yield None
+
+
+def git_blob_sha(data: bytes) -> str:
+    """Тот же SHA, что у git/GitHub: кэши общие для обоих источников."""
+    h = hashlib.sha1(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+class LocalSource(DocsSource):
+    """
+    Каталог на диске (например, docs/ из этого же репозитория) — без сети и лимитов GitHub.
+    Пути в дереве — относительно root, поэтому GH_DOCS_PATH работает так же, как для GitHub.
+    Содержимое хэшируется только у новых/изменённых файлов (по size + mtime).
+    """
+    name = "local"
+    remote = False
+
+    def __init__(self, root: str, docs_path: str):
+        self.root = os.path.abspath(root)
+        self.docs_path = docs_path.strip("/")
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}  # path -> (size, mtime_ns, sha)
+        self._tree: List[Dict[str, Any]] = []
+        self._revision = ""
+
+    def _abs(self, path: str) -> str:
+        full = os.path.abspath(os.path.join(self.root, path))
+        if os.path.commonpath([full, self.root]) != self.root:
+            raise ValueError(f"Path outside docs root: {path}")
+        return full
+
+    @staticmethod
+    def _read_file(full: str) -> bytes:
+        with open(full, "rb") as f:
+            return f.read()
+
+    def _scan(self) -> Tuple[List[Dict[str, Any]], str]:
+        tree: List[Dict[str, Any]] = []
+        seen: Dict[str, Tuple[int, int, str]] = {}
+        start = self._abs(self.docs_path)
+        for dirpath, dirnames, filenames in os.walk(start):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            rel_dir = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            if rel_dir != ".":
+                tree.append({"type": "tree", "path": rel_dir, "sha": "", "size": 0})
+            for name in sorted(filenames):
+                if name.startswith("."):
+                    continue
+                full = os.path.join(dirpath, name)
+                path = name if rel_dir == "." else f"{rel_dir}/{name}"
+                try:
+                    st = os.stat(full)
+                    old = self._hashes.get(path)
+                    if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                        sha = old[2]
+                    else:
+                        sha = git_blob_sha(self._read_file(full))
+                except OSError as e:
+                    log.warning("Docs: cannot read %s: %s", full, e)
+                    continue
+                seen[path] = (st.st_size, st.st_mtime_ns, sha)
+                tree.append({"type": "blob", "path": path, "sha": sha, "size": st.st_size})
+        self._hashes = seen
+        revision = hashlib.sha1("\n".join(f"{p}:{v[2]}" for p, v in sorted(seen.items())).encode()).hexdigest()
+        return tree, revision
+
+    async def head(self, etag: str = "") -> Tuple[Optional[str], Optional[str]]:
+        self._tree, self._revision = await asyncio.to_thread(self._scan)
+        if etag and etag == self._revision:
+            return None, etag
+        return self._revision, self._revision
+
+    async def tree(self, revision: str) -> List[Dict[str, Any]]:
+        if revision != self._revision:
+            await self.head()
+        return self._tree
+
+    async def read(self, path: str, sha: str) -> bytes:
+        full = self._abs(path)
+        return await asyncio.to_thread(self._read_file, full)
+
+    @asynccontextmanager
+    async def open_file(self, path: str, sha: str) -> AsyncIterator[Optional[str]]:
+        yield self._abs(path)
@@ -0,0 +1,200 @@
+# docsearch.py — поиск документов в памяти: нечёткий по именам (триграммы + токены) и по содержимому
+import io
+import re
+import html
+import math
+import bisect
+import zipfile
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_SPLIT_RE = re.compile(r"[^\w]+|_")
+
+def normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _SPLIT_RE.split(normalize(text)) if t]
+
+def _trigrams(tokens: Iterable[str]) -> Set[str]:
+    grams: Set[str] = set()
+    for t in tokens:
+        padded = f"  {t} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def _stem(path: str) -> str:
+    name = path.rsplit("/", 1)[-1]
+    return name.rsplit(".", 1)[0] if "." in name else name
+
+
+class NameIndex:
+    """
+    Триграммы имени файла (без расширения) -> пути; токены имени и папок — для бонуса за префикс.
+    Обновляется инкрементально через sync(): добавляются новые пути, удаляются исчезнувшие.
+    """
+
+    def __init__(self):
+        self._grams: Dict[str, Set[str]] = {}
+        self._docs: Dict[str, Tuple[Set[str], List[str]]] = {}  # path -> (триграммы, токены)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, path: str) -> None:
+        if path in self._docs:
+            return
+        name_tokens = tokenize(_stem(path))
+        dir_tokens = tokenize(path.rsplit("/", 1)[0]) if "/" in path else []
+        grams = _trigrams(name_tokens)
+        self._docs[path] = (grams, name_tokens + dir_tokens)
+        for g in grams:
+            self._grams.setdefault(g, set()).add(path)
+
+    def remove(self, path: str) -> None:
+        row = self._docs.pop(path, None)
+        if not row:
+            return
+        for g in row[0]:
+            bucket = self._grams.get(g)
+            if bucket is not None:
+                bucket.discard(path)
+                if not bucket:
+                    del self._grams[g]
+
+    def sync(self, paths: Iterable[str]) -> Tuple[int, int]:
+        """Приводит индекс к набору путей; возвращает (добавлено, удалено)."""
+        new = set(paths)
+        old = set(self._docs)
+        for p in old - new:
+            self.remove(p)
+        for p in new - old:
+            self.add(p)
+        return len(new - old), len(old - new)
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.25) -> List[Tuple[str, float]]:
+        q_tokens = tokenize(query)
+        q_grams = _trigrams(q_tokens)
+        if not q_grams:
+            return []
+        overlap: Counter = Counter()
+        for g in q_grams:
+            for path in self._grams.get(g, ()):
+                overlap[path] += 1
+
+        scored = []
+        for path, common in overlap.items():
+            grams, tokens = self._docs[path]
+            score = 2 * common / (len(q_grams) + len(grams))  # коэффициент Дайса
+            # каждое слово запроса, с которого начинается слово имени/папки, — сильный сигнал
+            prefix_hits = sum(1 for qt in q_tokens if any(t.startswith(qt) for t in tokens))
+            score += prefix_hits / len(q_tokens)
+            if score >= min_score:
+                scored.append((path, score))
+        scored.sort(key=lambda x: (-x[1], x[0].lower()))
+        return scored[:limit]
+
+
+# =========================
+#   ПОЛНОТЕКСТОВЫЙ ПОИСК
+# =========================
+FULLTEXT_EXTS = {"docx", "txt", "csv"}
+FULLTEXT_KEEP = 20000  # сколько текста держим на документ для сниппетов
+_XML_TAG_RE = re.compile(r"<[^>]+>")
+
+def extract_text(name: str, data: bytes) -> str:
+    """Текст из docx (zip с word/document.xml), txt и csv. Неподдерживаемое — пустая строка."""
+    ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    if ext == "docx":
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            xml = zf.read("word/document.xml").decode("utf-8", errors="ignore")
+        xml = xml.replace("</w:p>", "\n").replace("<w:tab/>", " ").replace("<w:br/>", "\n")
+        return html.unescape(_XML_TAG_RE.sub("", xml))
+    if ext in {"txt", "csv"}:
+        for enc in ("utf-8-sig", "cp1251"):
+            try:
+                return data.decode(enc)
+            except UnicodeDecodeError:
+                continue
+        return data.decode("utf-8", errors="ignore")
+    return ""
+
+def term_counts(text: str) -> Dict[str, int]:
+    return dict(Counter(t for t in tokenize(text) if len(t) > 1))
+
+
+class FullTextIndex:
+    """
+    Инвертированный индекс: слово -> {blob sha: частота}. Документ — это blob SHA
+    (одинаковое содержимое по разным путям индексируется один раз), пути к нему — в paths.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._docs: Dict[str, Tuple[Dict[str, int], str]] = {}  # sha -> (частоты, текст для сниппета)
+        self.paths: Dict[str, List[str]] = {}
+        self._terms: Optional[List[str]] = None  # отсортированный словарь для поиска по префиксу
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, sha: str) -> bool:
+        return sha in self._docs
+
+    def add(self, sha: str, terms: Dict[str, int], text: str) -> None:
+        if sha in self._docs:
+            return
+        self._docs[sha] = (terms, text[:FULLTEXT_KEEP])
+        self._terms = None
+        for t, tf in terms.items():
+            self._postings.setdefault(t, {})[sha] = tf
+
+    def remove(self, sha: str) -> None:
+        row = self._docs.pop(sha, None)
+        if not row:
+            return
+        self._terms = None
+        for t in row[0]:
+            bucket = self._postings.get(t)
+            if bucket is not None:
+                bucket.pop(sha, None)
+                if not bucket:
+                    del self._postings[t]
+
+    def retain(self, shas: Set[str]) -> None:
+        for sha in set(self._docs) - shas:
+            self.remove(sha)
+
+    def _snippet(self, text: str, q_tokens: List[str], width: int = 80) -> str:
+        low = normalize(text)
+        pos = min((i for i in (low.find(t) for t in q_tokens) if i >= 0), default=0)
+        start = max(pos - width // 2, 0)
+        frag = " ".join(text[start:start + width].split())
+        return ("…" if start > 0 else "") + frag + ("…" if start + width < len(text) else "")
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float, str]]:
+        """(sha, score, сниппет). Слова запроса совпадают по префиксу: «претенз» найдёт «претензия»."""
+        q_tokens = [t for t in tokenize(query) if len(t) > 1]
+        if not q_tokens or not self._docs:
+            return []
+        if self._terms is None:
+            self._terms = sorted(self._postings)
+        n = len(self._docs)
+        scores: Counter = Counter()
+        matched: Dict[str, int] = Counter()
+        for qt in q_tokens:
+            hit: Dict[str, int] = {}
+            i = bisect.bisect_left(self._terms, qt)
+            while i < len(self._terms) and self._terms[i].startswith(qt):
+                for sha, tf in self._postings[self._terms[i]].items():
+                    hit[sha] = hit.get(sha, 0) + tf
+                i += 1
+            if not hit:
+                continue
+            idf = math.log(1 + n / len(hit))
+            for sha, tf in hit.items():
+                scores[sha] += (1 + math.log(tf)) * idf
+                matched[sha] += 1
+        # документы со всеми словами запроса — выше
+        ranked = sorted(scores, key=lambda sha: (-matched[sha], -scores[sha]))[:limit]
+        return [(sha, scores[sha], self._snippet(self._docs[sha][1], q_tokens)) for sha in ranked]
@@ -10,6 +10,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter  # ✅ правильный импорт
 
 from db import notes as col
+from chunked import answer_chunked
 
 # Клавиатура раздела заметок
 notes_kb = ReplyKeyboardMarkup(
@@ -109,7 +110,7 @@ def register_notes_handlers(dp, is_authorized, refuse):
             preview = (it.get("text") or "").replace("\n", " ")[:120]
             lines.append(f"{i}. [{dt_str}] {preview}")
         lines.append("\nУдалить: `/delnote N` (номер из списка)")
-        await message.answer("\n".join(lines), parse_mode="Markdown", reply_markup=notes_kb)
+        await answer_chunked(message, "\n".join(lines), parse_mode="Markdown", reply_markup=notes_kb)
 
     # Удаление по номеру
     @dp.message(Command("delnote"))
@@ -0,0 +1,164 @@
+# outbox.py — постоянная очередь доставки (outbox) с повторами, backoff и dead-letter
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from db import outbox as col, dead_letters
+from dispatch import send_many
+
+log = logging.getLogger("outbox")
+
+# =========================
+#        НАСТРОЙКИ
+# =========================
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_BACKOFF_SEC = int(os.environ.get("OUTBOX_BACKOFF_SEC", "30"))      # 30s, 60s, 120s, ...
+OUTBOX_BACKOFF_MAX_SEC = int(os.environ.get("OUTBOX_BACKOFF_MAX_SEC", "3600"))
+OUTBOX_LEASE_SEC = int(os.environ.get("OUTBOX_LEASE_SEC", "120"))
+OUTBOX_BATCH = int(os.environ.get("OUTBOX_BATCH", "200"))
+OUTBOX_POLL_SEC = float(os.environ.get("OUTBOX_POLL_SEC", "30"))
+
+_LEASE_FIELDS = {"lease_owner": "", "lease_until": ""}
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(OUTBOX_BACKOFF_SEC * 2 ** max(attempts - 1, 0), OUTBOX_BACKOFF_MAX_SEC))
+
+def _is_permanent(err: Exception) -> bool:
+    # бот заблокирован / пользователь удалён / чат не найден — повторять бессмысленно;
+    # прочие 400 (разметка, длина и т.п.) идут обычными повторами и видны в last_error
+    if isinstance(err, TelegramForbiddenError):
+        return True
+    return isinstance(err, TelegramBadRequest) and "chat not found" in str(err).lower()
+
+# =========================
+#       ПОСТАНОВКА
+# =========================
+async def enqueue(messages: List[Dict]) -> int:
+    """
+    Кладёт сообщения {_id, chat_id, text, ...} в outbox.
+    _id задаёт вызывающий: повторная постановка того же сообщения молча игнорируется.
+    """
+    if not messages:
+        return 0
+    now = _now()
+    docs = [{**m, "status": "pending", "attempts": 0, "next_at": now, "created_at": now} for m in messages]
+    try:
+        res = await col.insert_many(docs, ordered=False)
+        return len(res.inserted_ids)
+    except BulkWriteError as e:
+        other = [w for w in e.details.get("writeErrors", []) if w.get("code") != 11000]
+        if other:
+            log.error("Outbox: enqueue errors: %s", other)
+        return e.details.get("nInserted", 0)
+
+# =========================
+#         РАЗБОР
+# =========================
+async def _claim_batch(owner: str, now: datetime) -> List[Dict]:
+    """Берёт в аренду пачку готовых к отправке сообщений (и брошенных упавшим обработчиком)."""
+    ready = {"$or": [
+        {"status": "pending", "next_at": {"$lte": now}},
+        {"status": "sending", "lease_until": {"$lte": now}},
+    ]}
+    ids = [d["_id"] async for d in col.find(ready, {"_id": 1}).sort("next_at", 1).limit(OUTBOX_BATCH)]
+    if not ids:
+        return []
+    await col.update_many(
+        {"_id": {"$in": ids}, **ready},
+        {"$set": {"status": "sending", "lease_owner": owner, "lease_until": now + timedelta(seconds=OUTBOX_LEASE_SEC)}},
+    )
+    return [d async for d in col.find({"_id": {"$in": ids}, "lease_owner": owner, "status": "sending"})]
+
+async def drain(bot) -> Dict[str, int]:
+    """
+    Отправляет всё, что готово, пачками до опустошения очереди.
+    Доставленное помечается sent, временные ошибки откладываются с экспоненциальным backoff,
+    постоянные и исчерпавшие попытки — уезжают в dead_letters.
+    """
+    owner = uuid.uuid4().hex
+    stats = {"sent": 0, "retried": 0, "dead": 0}
+    while True:
+        batch = await _claim_batch(owner, _now())
+        if not batch:
+            break
+        results = await send_many(bot, [(d["chat_id"], d["text"]) for d in batch])
+
+        now = _now()
+        ops, dead = [], []
+        for d, err in zip(batch, results):
+            mine = {"_id": d["_id"], "lease_owner": owner}
+            attempts = int(d.get("attempts", 0)) + 1
+            if err is None:
+                ops.append(UpdateOne(mine, {
+                    "$set": {"status": "sent", "sent_at": now, "attempts": attempts},
+                    "$unset": _LEASE_FIELDS,
+                }))
+                stats["sent"] += 1
+            elif _is_permanent(err) or attempts >= OUTBOX_MAX_ATTEMPTS:
+                row = {k: v for k, v in d.items() if k not in _LEASE_FIELDS}
+                dead.append({**row, "status": "dead", "attempts": attempts, "error": str(err), "failed_at": now})
+                ops.append(DeleteOne(mine))
+                stats["dead"] += 1
+            else:
+                ops.append(UpdateOne(mine, {
+                    "$set": {"status": "pending", "attempts": attempts, "next_at": now + _backoff(attempts), "last_error": str(err)},
+                    "$unset": _LEASE_FIELDS,
+                }))
+                stats["retried"] += 1
+
+        # сначала dead-letter, потом удаление: при падении между ними повтор даст дубль _id, а не потерю
+        if dead:
+            try:
+                await dead_letters.insert_many(dead, ordered=False)
+            except BulkWriteError as e:
+                other = [w for w in e.details.get("writeErrors", []) if w.get("code") != 11000]
+                if other:
+                    log.error("Outbox: dead-letter errors: %s", other)
+            log.warning("Outbox: %d messages moved to dead letters", len(dead))
+        try:
+            await col.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # аренда несохранённых истечёт, и их подберёт следующий разбор
+            log.error("Outbox: bulk write errors: %s", e.details.get("writeErrors"))
+    return stats
+
+# =========================
+#     ФОНОВЫЙ ОБРАБОТЧИК
+# =========================
+_task: Optional[asyncio.Task] = None
+
+async def _worker(bot) -> None:
+    while True:
+        try:
+            stats = await drain(bot)
+            if any(stats.values()):
+                log.info("Outbox: %s", stats)
+        except Exception:
+            log.exception("Outbox: drain failed")
+        await asyncio.sleep(OUTBOX_POLL_SEC)
+
+def start(bot) -> None:
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_worker(bot))
+
+async def stop() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
@@ -1,13 +1,28 @@
 # reminders.py — напоминания для aiogram v3 с хранением в Mongo и будильником через /cron/due
+import os
+import re
+import uuid
 import calendar
-from datetime import datetime, timedelta, timezone
-from typing import Iterable, Optional, List, Dict
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Iterable, Optional, List, Dict, Tuple
 
 from aiogram import types, F
 from aiogram.filters import Command
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from bson import ObjectId
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from config import ADMIN_IDS, ALLOWED_USERS, TIMEZONE as TZ_NAME
-from db import reminders as col
+from db import (
+    reminders as col, next_seq, advance_seq,
+    get_groups_members, list_groups, add_group_members, remove_group_members, delete_group,
+)
+import outbox
+from scheduler import scheduler
+
+log = logging.getLogger("reminders")
 
 # --- таймзона ---
 try:
@@ -70,25 +85,126 @@ def describe_repeat(rep: Optional[Dict]) -> str:
     if rep.get("freq") == "monthly": return f"ежемесячно (день {rep.get('dom')})"
     return "повтор?"
 
-# --- повторные расчёты ---
-def next_daily(dt: datetime) -> datetime: return dt + timedelta(days=1)
-
-def next_weekly(dt: datetime, dows: List[int]) -> datetime:
-    for i in range(1, 8):
-        cand = dt + timedelta(days=i)
-        if cand.weekday() in dows:
-            return cand.replace(hour=dt.hour, minute=dt.minute, second=0, microsecond=0)
-    return dt + timedelta(days=7)
-
-def next_monthly(dt: datetime, dom: int) -> datetime:
-    y, m = dt.year, dt.month
-    if m == 12:
-        y, m = y + 1, 1
+def stored_when(val) -> datetime:
+    """`when` из Mongo (naive UTC или ISO-строка) -> aware-время в TZ."""
+    if isinstance(val, str):
+        return make_aware(datetime.fromisoformat(val))
+    if val.tzinfo is None:
+        val = val.replace(tzinfo=timezone.utc)
+    return val.astimezone(TZ)
+
+# --- повторные расчёты: ближайшее срабатывание за O(1), сколько бы бот ни спал ---
+# Пропущенные срабатывания (инстанс спал):
+#   once — прозвенеть один раз; all — по разу за каждое пропущенное (не больше MISSED_MAX_FIRES);
+#   skip — прозвенеть, только если последнее срабатывание было не раньше MISSED_GRACE_SEC назад.
+MISSED_POLICY = os.environ.get("MISSED_POLICY", "once").strip().lower()
+MISSED_GRACE_SEC = int(os.environ.get("MISSED_GRACE_SEC", "900"))
+MISSED_MAX_FIRES = int(os.environ.get("MISSED_MAX_FIRES", "10"))
+
+def _at(d: date, hh: int, mm: int) -> datetime:
+    return make_aware(datetime(d.year, d.month, d.day, hh, mm))
+
+def _month_shift(y: int, m: int, k: int) -> Tuple[int, int]:
+    i = y * 12 + (m - 1) + k
+    return i // 12, i % 12 + 1
+
+def _monthly_day(y: int, m: int, dom: int) -> date:
+    return date(y, m, min(dom, calendar.monthrange(y, m)[1]))
+
+def _weekly_index(d: date, dows: List[int]) -> int:
+    """Сколько дней недели из dows было с 0001-01-01 по d включительно (ordinal 1 — понедельник)."""
+    o = d.toordinal()
+    return (o // 7) * len(dows) + sum(1 for x in dows if x < o % 7)
+
+def next_occurrence(rep: Dict, hh: int, mm: int, now: datetime) -> Optional[datetime]:
+    """Первое срабатывание правила строго после now."""
+    freq = rep.get("freq")
+    today = now.date()
+    if freq == "daily":
+        cand = _at(today, hh, mm)
+        return cand if cand > now else _at(today + timedelta(days=1), hh, mm)
+    if freq == "weekly":
+        dows = set(rep.get("dows") or [])
+        for i in range(8):
+            d = today + timedelta(days=i)
+            if d.weekday() in dows and _at(d, hh, mm) > now:
+                return _at(d, hh, mm)
+        return None
+    if freq == "monthly":
+        dom = int(rep.get("dom") or 0)
+        if not 1 <= dom <= 31:
+            return None
+        cand = _at(_monthly_day(now.year, now.month, dom), hh, mm)
+        if cand <= now:
+            y, m = _month_shift(now.year, now.month, 1)
+            cand = _at(_monthly_day(y, m, dom), hh, mm)
+        return cand
+    return None
+
+def prev_occurrence(rep: Dict, hh: int, mm: int, now: datetime) -> Optional[datetime]:
+    """Последнее срабатывание правила не позже now."""
+    freq = rep.get("freq")
+    today = now.date()
+    if freq == "daily":
+        cand = _at(today, hh, mm)
+        return cand if cand <= now else _at(today - timedelta(days=1), hh, mm)
+    if freq == "weekly":
+        dows = set(rep.get("dows") or [])
+        for i in range(8):
+            d = today - timedelta(days=i)
+            if d.weekday() in dows and _at(d, hh, mm) <= now:
+                return _at(d, hh, mm)
+        return None
+    if freq == "monthly":
+        dom = int(rep.get("dom") or 0)
+        if not 1 <= dom <= 31:
+            return None
+        cand = _at(_monthly_day(now.year, now.month, dom), hh, mm)
+        if cand > now:
+            y, m = _month_shift(now.year, now.month, -1)
+            cand = _at(_monthly_day(y, m, dom), hh, mm)
+        return cand
+    return None
+
+def occurrences_between(rep: Dict, start: datetime, end: datetime) -> int:
+    """Сколько срабатываний в [start, end), если оба — срабатывания правила."""
+    freq = rep.get("freq")
+    if freq == "daily":
+        return (end.date() - start.date()).days
+    if freq == "weekly":
+        dows = sorted(set(rep.get("dows") or []))
+        one = timedelta(days=1)
+        return _weekly_index(end.date() - one, dows) - _weekly_index(start.date() - one, dows)
+    if freq == "monthly":
+        return (end.year * 12 + end.month) - (start.year * 12 + start.month)
+    return 0
+
+def plan_fires(it: Dict, now: datetime) -> Tuple[int, Optional[datetime]]:
+    """
+    Сколько раз прозвенеть сейчас и куда перенести напоминание (None — удалить).
+    Перенос всегда один — сразу на первое срабатывание после now.
+    """
+    when = stored_when(it["when"])
+    rep = it.get("repeat")
+    last = when
+    nxt = None
+    missed = 1
+    if rep:
+        nxt = next_occurrence(rep, when.hour, when.minute, now)
+        if nxt is not None:
+            missed = max(1, occurrences_between(rep, when, nxt))
+            last = prev_occurrence(rep, when.hour, when.minute, now) or when
+
+    # политика пропусков — только для повторов; разовое напоминание звенит всегда, хоть и с опозданием
+    if not rep:
+        fires = 1
+    elif MISSED_POLICY == "all":
+        fires = min(missed, MISSED_MAX_FIRES)
+    elif MISSED_POLICY == "skip":
+        fires = 1 if (now - last).total_seconds() <= MISSED_GRACE_SEC else 0
     else:
-        m += 1
-    last = calendar.monthrange(y, m)[1]
-    d = min(dom, last)
-    return dt.replace(year=y, month=m, day=d)
+        fires = 1
+    return fires, nxt
 
 # ---- получатели рассылки (учитываем Mongo allowlist из bot.allowed_dynamic) ----
 def _recipients(bot_instance=None) -> List[int]:
@@ -97,47 +213,262 @@ def _recipients(bot_instance=None) -> List[int]:
         dyn = set(getattr(bot_instance, "allowed_dynamic", set()))
     return sorted(ENV_ADMINS | ENV_ALLOWED | dyn)
 
+# ---- адресаты: всем (по умолчанию), админам, группе или списку ID ----
+# В тексте команды — первым словом: `@admins`, `@имя_группы`, `@123,456`.
+# `@слово`, не являющееся группой, остаётся частью текста; `@@слово` — всегда текст (`@слово`).
+def parse_audience(text: str) -> Tuple[Optional[Dict], str]:
+    """Кандидат в адресаты; группу (kind=group) ещё надо проверить на существование."""
+    head, _, rest = text.strip().partition(" ")
+    if head.startswith("@@"):
+        return None, text.strip()[1:]
+    if not head.startswith("@") or len(head) < 2 or not rest.strip():
+        return None, text
+    val = head[1:]
+    if val.lower() in {"admins", "админы"}:
+        return {"kind": "admins"}, rest.strip()
+    ids = [x for x in val.split(",") if x]
+    if ids and all(x.isdigit() for x in ids):
+        return {"kind": "users", "ids": sorted({int(x) for x in ids})}, rest.strip()
+    return {"kind": "group", "name": val.lower()}, rest.strip()
+
+def describe_audience(aud: Optional[Dict]) -> str:
+    """Для ответов с parse_mode=Markdown: имя группы — в code span."""
+    if not aud: return "всем"
+    if aud.get("kind") == "admins": return "админам"
+    if aud.get("kind") == "group": return "группе `{}`".format(str(aud.get("name")).replace("`", "'"))
+    if aud.get("kind") == "users": return "ID " + ",".join(map(str, aud.get("ids", [])))
+    return "?"
+
+def _audience_key(aud: Optional[Dict]) -> tuple:
+    if not aud: return ("all",)
+    if aud.get("kind") == "group": return ("group", aud.get("name"))
+    if aud.get("kind") == "users": return ("users", tuple(sorted(int(x) for x in aud.get("ids", []))))
+    return (aud.get("kind"),)
+
+async def _resolve_audiences(items: List[Dict], everyone: List[int], cache: Dict[tuple, List[int]]) -> None:
+    """Заполняет cache (ключ — _audience_key) для всех напоминаний пачки; группы — одним запросом."""
+    missing = set()
+    for it in items:
+        aud = it.get("audience")
+        key = _audience_key(aud)
+        if key in cache:
+            continue
+        if not aud:
+            cache[key] = everyone
+        elif aud.get("kind") == "admins":
+            cache[key] = sorted(ENV_ADMINS)
+        elif aud.get("kind") == "users":
+            cache[key] = sorted({int(x) for x in aud.get("ids", [])})
+        elif aud.get("kind") == "group":
+            missing.add(aud.get("name"))
+        else:
+            cache[key] = []
+    if missing:
+        found = await get_groups_members(sorted(missing))
+        for name in missing:
+            if name not in found:
+                log.warning("Reminders: group %s not found", name)
+            cache[("group", name)] = sorted(found.get(name, set()))
+
+# ---- аренда (lease) напоминаний: параллельные прогоны делят работу, а не дублируют ----
+REMINDER_LEASE_SEC = int(os.environ.get("REMINDER_LEASE_SEC", "300"))
+REMINDER_WRITE_BATCH = int(os.environ.get("REMINDER_WRITE_BATCH", "500"))
+
+async def _claim_due(owner: str, now: datetime) -> Optional[Dict]:
+    """Атомарно забирает одно сработавшее напоминание, если на нём нет живой аренды."""
+    return await col.find_one_and_update(
+        {
+            "when": {"$lte": now},
+            "$or": [{"lease_until": None}, {"lease_until": {"$lte": now}}],
+        },
+        {"$set": {"lease_owner": owner, "lease_until": now + timedelta(seconds=REMINDER_LEASE_SEC)}},
+        sort=[("when", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+# ---- ID напоминаний: счётчик на префикс вместо count_documents по regex ----
+REMINDER_ID_ATTEMPTS = 3
+
+async def _max_used_seq(base: str) -> int:
+    """Наибольший N среди существующих `BASE-N` (-1, если таких нет)."""
+    prefix = f"{base}-"
+    best = -1
+    async for it in col.find({"id": {"$regex": f"^{re.escape(prefix)}\\d+$"}}, {"id": 1}):
+        best = max(best, int(it["id"][len(prefix):]))
+    return best
+
+async def _insert_with_id(base: str, doc: Dict) -> str:
+    """Вставляет напоминание с ID `BASE-N`; N берётся из счётчика `reminder:BASE`."""
+    seq_name = f"reminder:{base}"
+    for _ in range(REMINDER_ID_ATTEMPTS):
+        rem_id = f"{base}-{await next_seq(seq_name)}"
+        try:
+            await col.insert_one({"id": rem_id, **doc})
+            return rem_id
+        except DuplicateKeyError:
+            # счётчик отстал от существующих ID (напоминания до счётчика, ручная вставка, восстановление)
+            await advance_seq(seq_name, await _max_used_seq(base) + 1)
+    raise RuntimeError(f"Cannot allocate reminder id for {base}")
+
+# ---- загрузка расписания для внутрипроцессного будильника ----
+async def load_schedule() -> List[tuple[str, datetime]]:
+    out = []
+    async for it in col.find({}, {"id": 1, "when": 1}):
+        out.append((it.get("id") or str(it["_id"]), stored_when(it["when"])))
+    return out
+
 # ---- основной прогон для крона ----
-async def process_due_reminders(bot) -> int:
-    now = now_tz()
-    due = [x async for x in col.find({"when": {"$lte": now}})]
-    total = 0
-    users = _recipients(bot)
+async def _process_batch(due: List[Dict], owner: str, now: datetime, users: List[int],
+                         audiences: Dict[tuple, List[int]], summary: Dict[str, int]) -> None:
+    await _resolve_audiences(due, users, audiences)
+    plans = []
     for it in due:
         try:
-            text = it.get("text", "")
-            for uid in users:
-                try:
-                    await bot.send_message(uid, f"🔔 Напоминание:\n{text}")
-                except Exception:
-                    pass
-
-            rep = it.get("repeat")
-            if rep:
-                when = it["when"]
-                if isinstance(when, str):
-                    when = datetime.fromisoformat(when)
-                when = make_aware(when)
-                if rep["freq"] == "daily":
-                    nxt = next_daily(when)
-                elif rep["freq"] == "weekly":
-                    nxt = next_weekly(when, rep.get("dows", []))
-                elif rep["freq"] == "monthly":
-                    nxt = next_monthly(when, int(rep.get("dom")))
-                else:
-                    nxt = None
-
-                if nxt:
-                    await col.update_one({"_id": it["_id"]}, {"$set": {"when": nxt}})
-                else:
-                    await col.delete_one({"_id": it["_id"]})
-            else:
-                await col.delete_one({"_id": it["_id"]})
-            total += 1
+            plans.append((it, *plan_fires(it, now)))
         except Exception:
-            # не роняем прогон целиком
-            pass
-    return total
+            log.exception("Reminders: bad schedule for %s", it.get("id"))
+            plans.append((it, 1, None))
+
+    # раскладываем по сообщению на получателя; _id детерминирован, так что повтор после падения
+    # (аренда истекла, напоминание забрали снова) не поставит дубль
+    messages = []
+    for it, fires, _ in plans:
+        fired_at = stored_when(it["when"]).strftime("%Y%m%d%H%M")
+        for n in range(fires):
+            for uid in audiences[_audience_key(it.get("audience"))]:
+                messages.append({
+                    "_id": f"{it['_id']}:{fired_at}:{n}:{uid}",
+                    "chat_id": uid,
+                    "text": f"🔔 Напоминание:\n{it.get('text', '')}",
+                    "reminder_id": it.get("id"),
+                })
+    summary["queued"] += await outbox.enqueue(messages)
+
+    # переносы и удаления — одним unordered bulk_write вместо запроса на каждое
+    ops = []
+    for it, _, nxt in plans:
+        # пишем только пока аренда наша: если она истекла и её перехватили — не трогаем
+        mine = {"_id": it["_id"], "lease_owner": owner}
+        if nxt:
+            ops.append(UpdateOne(mine, {
+                "$set": {"when": nxt},
+                "$unset": {"lease_owner": "", "lease_until": ""},
+            }))
+        else:
+            ops.append(DeleteOne(mine))
+    failed = set()  # индексы ops (они же индексы plans), которые не записались
+    try:
+        res = await col.bulk_write(ops, ordered=False)
+        matched, deleted = res.matched_count, res.deleted_count
+    except BulkWriteError as e:
+        # не роняем прогон целиком; аренда несохранённых истечёт сама
+        errors = e.details.get("writeErrors", [])
+        log.error("Reminders: bulk write errors: %s", errors)
+        failed = {w.get("index") for w in errors}
+        matched, deleted = e.details.get("nMatched", 0), e.details.get("nRemoved", 0)
+    except Exception:
+        log.exception("Reminders: bulk write failed")
+        failed = set(range(len(ops)))
+        matched, deleted = 0, 0
+    summary["processed"] += len(plans)
+    summary["rescheduled"] += matched
+    summary["deleted"] += deleted
+    summary["failed"] += len(ops) - matched - deleted
+    # будильнику — только реально перенесённые; остальные подберёт следующий прогон
+    for i, (it, _, nxt) in enumerate(plans):
+        if nxt and i not in failed:
+            scheduler.push(it.get("id") or str(it["_id"]), nxt)
+
+def _add_stats(summary: Dict[str, int], stats: Dict[str, int]) -> None:
+    for k, v in stats.items():
+        summary[k] = summary.get(k, 0) + v
+
+async def process_due_reminders(bot, *, on_progress: Optional[Callable[[Dict[str, int]], Awaitable]] = None) -> Dict[str, int]:
+    """
+    Обрабатывает сработавшие напоминания пачками по REMINDER_WRITE_BATCH:
+    забрать в аренду -> поставить в outbox -> перенести/удалить -> доставить.
+    Каждая пачка завершается целиком, после неё вызывается on_progress(summary).
+    """
+    now = now_tz()
+    owner = uuid.uuid4().hex
+    users = _recipients(bot)
+    audiences: Dict[tuple, List[int]] = {}  # адресаты, разрешённые за этот прогон
+    summary = {"processed": 0, "rescheduled": 0, "deleted": 0, "failed": 0, "queued": 0,
+               "sent": 0, "retried": 0, "dead": 0}
+    while True:
+        due = []
+        while len(due) < REMINDER_WRITE_BATCH:
+            it = await _claim_due(owner, now)
+            if it is None:
+                break
+            due.append(it)
+        if not due:
+            break
+        await _process_batch(due, owner, now, users, audiences, summary)
+        _add_stats(summary, await outbox.drain(bot))
+        if on_progress is not None:
+            await on_progress(summary)
+
+    # отложенные повторы доставки, даже если новых напоминаний не было
+    _add_stats(summary, await outbox.drain(bot))
+    return summary
+
+# ---- список: keyset-пагинация по (when, _id) ----
+REMINDERS_PAGE = int(os.environ.get("REMINDERS_PAGE", "10"))
+_LIST_FIELDS = {"id": 1, "when": 1, "repeat": 1, "audience": 1, "text": 1}
+_PREVIEW_LEN = 200  # чтобы страница гарантированно влезала в одно сообщение
+
+def _md_escape(text: str) -> str:
+    """Экранирование для parse_mode=Markdown (legacy): _ * ` [ выводятся как есть."""
+    return re.sub(r"([_*`\[])", r"\\\1", text)
+
+def _page_key(it: Dict) -> str:
+    """Курсор для callback_data: `<when в мс>.<_id>` (до 38 байт)."""
+    ms = int(stored_when(it["when"]).timestamp() * 1000)
+    return f"{ms}.{it['_id']}"
+
+def _parse_page_key(key: str) -> Tuple[datetime, ObjectId]:
+    ms, oid = key.split(".", 1)
+    return datetime.fromtimestamp(int(ms) / 1000, tz=timezone.utc), ObjectId(oid)
+
+async def reminders_page(after: Optional[str] = None, before: Optional[str] = None) -> Tuple[List[Dict], bool, bool]:
+    """Страница списка после/до курсора. Возвращает (напоминания, есть_предыдущая, есть_следующая)."""
+    if before:
+        when, oid = _parse_page_key(before)
+        flt = {"$or": [{"when": {"$lt": when}}, {"when": when, "_id": {"$lt": oid}}]}
+        cur = col.find(flt, _LIST_FIELDS).sort([("when", -1), ("_id", -1)]).limit(REMINDERS_PAGE + 1)
+        items = [x async for x in cur]
+        has_prev = len(items) > REMINDERS_PAGE
+        return list(reversed(items[:REMINDERS_PAGE])), has_prev, True
+
+    flt = {}
+    if after:
+        when, oid = _parse_page_key(after)
+        flt = {"$or": [{"when": {"$gt": when}}, {"when": when, "_id": {"$gt": oid}}]}
+    cur = col.find(flt, _LIST_FIELDS).sort([("when", 1), ("_id", 1)]).limit(REMINDERS_PAGE + 1)
+    items = [x async for x in cur]
+    return items[:REMINDERS_PAGE], bool(after), len(items) > REMINDERS_PAGE
+
+def render_reminders_page(items: List[Dict], has_prev: bool, has_next: bool) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    lines = []
+    for it in items:
+        when_str = stored_when(it["when"]).strftime("%Y-%m-%d %H:%M")
+        rep = it.get("repeat")
+        aud = it.get("audience")
+        to = f" — {describe_audience(aud)}" if aud else ""
+        text = it.get("text", "")
+        if len(text) > _PREVIEW_LEN:
+            text = text[:_PREVIEW_LEN] + "…"
+        text = _md_escape(text)  # обрезка могла разрезать сущность — разметку текста не интерпретируем
+        lines.append(f"- `{it.get('id')}` — *{when_str}* — {describe_repeat(rep)}{to} — {text}")
+
+    nav = []
+    if has_prev and items:
+        nav.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"rem:p:{_page_key(items[0])}"))
+    if has_next and items:
+        nav.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"rem:n:{_page_key(items[-1])}"))
+    kb = InlineKeyboardMarkup(inline_keyboard=[nav]) if nav else None
+    return "*Напоминания:*\n" + "\n".join(lines), kb
 
 # --- кнопка распознавания ---
 def _is_reminders_button(text: str) -> bool:
@@ -160,6 +491,19 @@ def register_reminders_handlers(dp, is_authorized, refuse, *, bot_instance=None)
         # локальная функция для help и т.д.
         return _recipients(bot_instance)
 
+    async def take_audience(message: types.Message, text: str) -> Optional[Tuple[Dict, str]]:
+        """Снимает `@адресат` с начала текста; None — группы нет, пользователю уже ответили."""
+        aud, rest = parse_audience(text)
+        if aud and aud["kind"] == "group" and not await get_groups_members([aud["name"]]):
+            name = aud["name"].replace("`", "'")
+            await message.reply(
+                f"Группа `{name}` не найдена. Создать: `/group_add {name} ID ...`\n"
+                f"Если `@` — часть текста, начните с `@@{name}`.",
+                parse_mode="Markdown",
+            )
+            return None
+        return ({"audience": aud} if aud else {}), rest
+
     @dp.message(F.text.func(_is_reminders_button))
     async def reminders_button(message: types.Message):
         if not is_admin(message.from_user.id):
@@ -179,9 +523,13 @@ def register_reminders_handlers(dp, is_authorized, refuse, *, bot_instance=None)
             "• `/remindall_daily HH:MM Текст`\n"
             "• `/remindall_weekly ДНИ HH:MM Текст` (дни: `пн,вт,ср,чт,пт,сб,вс` или `mon,tue,...`)\n"
             "• `/remindall_monthly DD HH:MM Текст` (день 1–31)\n\n"
+            "Адресаты (по умолчанию — всем): первым словом текста\n"
+            "`@admins`, `@группа` или `@123,456` (`@@текст` — просто текст с @)\n\n"
             "Управление:\n"
             "• `/reminders` — список\n"
             "• `/delreminder ID` — удалить\n"
+            "• `/groups` — группы адресатов\n"
+            "• `/group_add ИМЯ ID ...` / `/group_del ИМЯ [ID ...]`\n"
         )
         await message.reply(text, parse_mode="Markdown")
 
@@ -203,14 +551,17 @@ def register_reminders_handlers(dp, is_authorized, refuse, *, bot_instance=None)
             await message.reply("Дата/время: `YYYY-MM-DD HH:MM`.", parse_mode="Markdown"); return
         if run_at <= now_tz():
             await message.reply("Время уже прошло. Укажи будущее время."); return
+        parsed = await take_audience(message, text)
+        if parsed is None:
+            return
+        extra, text = parsed
 
         base = f"ONE-{y:04d}{m:02d}{d:02d}{hh:02d}{mm:02d}"
-        num = await col.count_documents({"id": {"$regex": f"^{base}"}})
-        rem_id = f"{base}-{num}"
-
-        await col.insert_one({"id": rem_id, "when": run_at, "text": text})
+        rem_id = await _insert_with_id(base, {"when": run_at, "text": text, **extra})
+        scheduler.push(rem_id, run_at)
         await message.reply(
-            f"✅ Разовое на *{y:04d}-{m:02d}-{d:02d} {hh:02d}:{mm:02d}*\nID: `{rem_id}`\nТекст:\n```\n{text}\n```",
+            f"✅ Разовое на *{y:04d}-{m:02d}-{d:02d} {hh:02d}:{mm:02d}*\n"
+            f"Кому: {describe_audience(extra.get('audience'))}\nID: `{rem_id}`\nТекст:\n```\n{text}\n```",
             parse_mode="Markdown"
         )
 
@@ -226,19 +577,19 @@ def register_reminders_handlers(dp, is_authorized, refuse, *, bot_instance=None)
         if not hm:
             await message.reply("Время: `HH:MM`.", parse_mode="Markdown"); return
         hh, mm = hm
+        parsed = await take_audience(message, args[2])
+        if parsed is None:
+            return
+        extra, text = parsed
 
-        now = now_tz()
-        start = make_aware(datetime(now.year, now.month, now.day, hh, mm))
-        if start <= now:
-            start += timedelta(days=1)
+        start = next_occurrence({"freq": "daily"}, hh, mm, now_tz())
 
         base = f"DLY-{hh:02d}{mm:02d}"
-        num = await col.count_documents({"id": {"$regex": f"^{base}"}})
-        rem_id = f"{base}-{num}"
-
-        await col.insert_one({"id": rem_id, "when": start, "text": args[2], "repeat": {"freq": "daily"}})
+        rem_id = await _insert_with_id(base, {"when": start, "text": text, "repeat": {"freq": "daily"}, **extra})
+        scheduler.push(rem_id, start)
         await message.reply(
-            f"✅ Ежедневно в *{hh:02d}:{mm:02d}*\nПервый запуск: *{start.strftime('%Y-%m-%d %H:%M')}*\nID: `{rem_id}`",
+            f"✅ Ежедневно в *{hh:02d}:{mm:02d}*\nПервый запуск: *{start.strftime('%Y-%m-%d %H:%M')}*\n"
+            f"Кому: {describe_audience(extra.get('audience'))}\nID: `{rem_id}`",
             parse_mode="Markdown"
         )
 
@@ -255,28 +606,25 @@ def register_reminders_handlers(dp, is_authorized, refuse, *, bot_instance=None)
         if not dows or not hm:
             await message.reply("Дни: `пн,вт,...` или `mon,tue,...`; время: `HH:MM`.", parse_mode="Markdown"); return
         hh, mm = hm
+        parsed = await take_audience(message, parts[3])
+        if parsed is None:
+            return
+        extra, text = parsed
 
-        now = now_tz()
-        candidate = make_aware(datetime(now.year, now.month, now.day, hh, mm))
-        if candidate <= now or candidate.weekday() not in dows:
-            for i in range(1, 8):
-                cand = candidate + timedelta(days=i)
-                if cand.weekday() in dows:
-                    candidate = cand; break
+        candidate = next_occurrence({"freq": "weekly", "dows": dows}, hh, mm, now_tz())
 
         base = f"WKY-{human_dow_list(dows)}-{hh:02d}{mm:02d}"
-        num = await col.count_documents({"id": {"$regex": f"^{base}"}})
-        rem_id = f"{base}-{num}"
-
-        await col.insert_one({
-            "id": rem_id,
+        rem_id = await _insert_with_id(base, {
             "when": candidate,
-            "text": parts[3],
-            "repeat": {"freq": "weekly", "dows": dows}
+            "text": text,
+            "repeat": {"freq": "weekly", "dows": dows},
+            **extra,
         })
+        scheduler.push(rem_id, candidate)
         await message.reply(
             f"✅ Еженедельно *{human_dow_list(dows)}* в *{hh:02d}:{mm:02d}*\n"
-            f"Первый запуск: *{candidate.strftime('%Y-%m-%d %H:%M')}*\nID: `{rem_id}`",
+            f"Первый запуск: *{candidate.strftime('%Y-%m-%d %H:%M')}*\n"
+            f"Кому: {describe_audience(extra.get('audience'))}\nID: `{rem_id}`",
             parse_mode="Markdown"
         )
 
@@ -297,32 +645,25 @@ def register_reminders_handlers(dp, is_authorized, refuse, *, bot_instance=None)
         if not hm:
             await message.reply("Время: `HH:MM`.", parse_mode="Markdown"); return
         hh, mm = hm
+        parsed = await take_audience(message, parts[3])
+        if parsed is None:
+            return
+        extra, text = parsed
 
-        now = now_tz()
-        y, m = now.year, now.month
-        last = calendar.monthrange(y, m)[1]
-        d = min(dd, last)
-        cand = make_aware(datetime(y, m, d, hh, mm))
-        if cand <= now:
-            if m == 12: y, m = y + 1, 1
-            else: m += 1
-            last = calendar.monthrange(y, m)[1]
-            d = min(dd, last)
-            cand = make_aware(datetime(y, m, d, hh, mm))
+        cand = next_occurrence({"freq": "monthly", "dom": dd}, hh, mm, now_tz())
 
         base = f"MTH-{dd:02d}-{hh:02d}{mm:02d}"
-        num = await col.count_documents({"id": {"$regex": f"^{base}"}})
-        rem_id = f"{base}-{num}"
-
-        await col.insert_one({
-            "id": rem_id,
+        rem_id = await _insert_with_id(base, {
             "when": cand,
-            "text": parts[3],
-            "repeat": {"freq": "monthly", "dom": dd}
+            "text": text,
+            "repeat": {"freq": "monthly", "dom": dd},
+            **extra,
         })
+        scheduler.push(rem_id, cand)
         await message.reply(
             f"✅ Ежемесячно *день {dd}* в *{hh:02d}:{mm:02d}*\n"
-            f"Первый запуск: *{cand.strftime('%Y-%m-%d %H:%M')}*\nID: `{rem_id}`",
+            f"Первый запуск: *{cand.strftime('%Y-%m-%d %H:%M')}*\n"
+            f"Кому: {describe_audience(extra.get('audience'))}\nID: `{rem_id}`",
             parse_mode="Markdown"
         )
 
@@ -332,20 +673,29 @@ def register_reminders_handlers(dp, is_authorized, refuse, *, bot_instance=None)
         if not is_admin(message.from_user.id):
             await message.reply("⛔ Команда только для админов."); return
 
-        items = [x async for x in col.find().sort("when", 1)]
+        items, has_prev, has_next = await reminders_page()
         if not items:
             await message.reply("Запланированных напоминаний нет."); return
+        text, kb = render_reminders_page(items, has_prev, has_next)
+        await message.reply(text, parse_mode="Markdown", reply_markup=kb)
 
-        lines = []
-        for it in items:
-            when = it["when"]
-            if isinstance(when, str):
-                when = datetime.fromisoformat(when)
-            when = make_aware(when)
-            when_str = when.strftime("%Y-%m-%d %H:%M")
-            rep = it.get("repeat")
-            lines.append(f"- `{it.get('id')}` — *{when_str}* — {describe_repeat(rep)} — {it.get('text','')}")
-        await message.reply("*Напоминания:*\n" + "\n".join(lines), parse_mode="Markdown")
+    @dp.callback_query(F.data.startswith("rem:"))
+    async def remind_list_page(cb: CallbackQuery):
+        if not is_admin(cb.from_user.id):
+            await cb.answer("⛔ Только для админов."); return
+        try:
+            _, direction, key = cb.data.split(":", maxsplit=2)
+            if direction == "n":
+                items, has_prev, has_next = await reminders_page(after=key)
+            else:
+                items, has_prev, has_next = await reminders_page(before=key)
+        except Exception:
+            await cb.answer("Некорректные данные"); return
+        if not items:
+            await cb.answer("Больше нет"); return
+        text, kb = render_reminders_page(items, has_prev, has_next)
+        await cb.message.edit_text(text, parse_mode="Markdown", reply_markup=kb)
+        await cb.answer()
 
     # --- удаление ---
     @dp.message(Command("delreminder"))
@@ -357,7 +707,52 @@ def register_reminders_handlers(dp, is_authorized, refuse, *, bot_instance=None)
             await message.reply("Использование: `/delreminder ID`", parse_mode="Markdown"); return
         rem_id = parts[1].strip()
         res = await col.delete_one({"id": rem_id})
+        scheduler.discard(rem_id)
         if res.deleted_count == 0:
             await message.reply(f"Напоминание `{rem_id}` не найдено.", parse_mode="Markdown")
         else:
             await message.reply(f"🗑 Напоминание `{rem_id}` удалено.", parse_mode="Markdown")
+
+    # --- группы адресатов ---
+    @dp.message(Command("groups"))
+    async def groups_list(message: types.Message):
+        if not is_admin(message.from_user.id):
+            await message.reply("⛔ Команда только для админов."); return
+        groups = await list_groups()
+        if not groups:
+            await message.reply("Групп нет. Создать: `/group_add ИМЯ ID ...`", parse_mode="Markdown"); return
+        lines = [f"- `{name}`: `{', '.join(map(str, sorted(ids))) or '—'}`" for name, ids in groups.items()]
+        await message.reply("*Группы:*\n" + "\n".join(lines), parse_mode="Markdown")
+
+    def _group_args(message: types.Message) -> Optional[Tuple[str, List[int]]]:
+        parts = (message.text or "").split()
+        if len(parts) < 2 or not all(x.isdigit() for x in parts[2:]):
+            return None
+        return parts[1].lstrip("@").lower(), [int(x) for x in parts[2:]]
+
+    @dp.message(Command("group_add"))
+    async def group_add(message: types.Message):
+        if not is_admin(message.from_user.id):
+            await message.reply("⛔ Команда только для админов."); return
+        args = _group_args(message)
+        if not args or not args[1]:
+            await message.reply("Использование: `/group_add ИМЯ ID [ID ...]`", parse_mode="Markdown"); return
+        name, ids = args
+        await add_group_members(name, ids)
+        await message.reply(f"✅ Группа `{name}`: добавлено {len(ids)}.", parse_mode="Markdown")
+
+    @dp.message(Command("group_del"))
+    async def group_del(message: types.Message):
+        if not is_admin(message.from_user.id):
+            await message.reply("⛔ Команда только для админов."); return
+        args = _group_args(message)
+        if not args:
+            await message.reply("Использование: `/group_del ИМЯ [ID ...]` (без ID — удалить группу)", parse_mode="Markdown"); return
+        name, ids = args
+        if ids:
+            await remove_group_members(name, ids)
+            await message.reply(f"🗑 Группа `{name}`: удалено {len(ids)}.", parse_mode="Markdown")
+        elif await delete_group(name):
+            await message.reply(f"🗑 Группа `{name}` удалена.", parse_mode="Markdown")
+        else:
+            await message.reply(f"Группа `{name}` не найдена.", parse_mode="Markdown")
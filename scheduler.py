@@ -0,0 +1,98 @@
+# scheduler.py — точный внутрипроцессный будильник напоминаний (min-heap по времени срабатывания)
+import os
+import time
+import heapq
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger("scheduler")
+
+# Включается явно; /cron/due остаётся страховкой (добирает пропущенное после сна инстанса)
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "false").lower() == "true"
+# Дольше не спим даже при далёкой вершине — перепроверяем часы
+SCHEDULER_MAX_SLEEP = float(os.environ.get("SCHEDULER_MAX_SLEEP", "3600"))
+
+
+class ReminderScheduler:
+    """
+    Куча (ts, id) + словарь id -> актуальный ts.
+    Изменение/удаление — ленивое: устаревшие записи кучи выкидываются при подъёме на вершину.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self._when: Dict[str, float] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._run_due: Optional[Callable[[], Awaitable]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def push(self, rem_id: str, when: datetime) -> None:
+        """Добавить напоминание или перенести его на новое время."""
+        if not self.running:
+            return
+        ts = when.timestamp()
+        self._when[rem_id] = ts
+        heapq.heappush(self._heap, (ts, rem_id))
+        if self._heap[0] == (ts, rem_id):
+            self._wake.set()  # новая вершина — надо проснуться раньше
+
+    def discard(self, rem_id: str) -> None:
+        self._when.pop(rem_id, None)
+
+    def _top(self) -> Optional[Tuple[float, str]]:
+        while self._heap:
+            ts, rem_id = self._heap[0]
+            if self._when.get(rem_id) == ts:
+                return ts, rem_id
+            heapq.heappop(self._heap)
+        return None
+
+    async def start(self, run_due: Callable[[], Awaitable], entries: Iterable[Tuple[str, datetime]]) -> None:
+        self._run_due = run_due
+        self._when = {rem_id: when.timestamp() for rem_id, when in entries}
+        self._heap = [(ts, rem_id) for rem_id, ts in self._when.items()]
+        heapq.heapify(self._heap)
+        self._task = asyncio.create_task(self._loop())
+        log.info("Scheduler: started with %d reminders", len(self._heap))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            top = self._top()
+            delay = SCHEDULER_MAX_SLEEP if top is None else min(top[0] - time.time(), SCHEDULER_MAX_SLEEP)
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # снимаем всё, что уже наступило; повторяющиеся вернутся через push() после переноса
+            now = time.time()
+            while top is not None and top[0] <= now:
+                heapq.heappop(self._heap)
+                self._when.pop(top[1], None)
+                top = self._top()
+            try:
+                await self._run_due()
+            except Exception:
+                log.exception("Scheduler: run failed")
+
+
+scheduler = ReminderScheduler()
@@ -0,0 +1,41 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost")
+os.environ.setdefault("TOKEN", "1:test")
+
+import reminders  # noqa: E402
+
+NOW = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def test_one_time_reminder_fires_even_when_late_under_skip(monkeypatch):
+    monkeypatch.setattr(reminders, "MISSED_POLICY", "skip")
+    it = {"when": NOW - timedelta(seconds=reminders.MISSED_GRACE_SEC + 3600), "repeat": None}
+    assert reminders.plan_fires(it, NOW) == (1, None)
+
+
+def test_daily_reminder_skips_stale_fire_under_skip(monkeypatch):
+    monkeypatch.setattr(reminders, "MISSED_POLICY", "skip")
+    it = {"when": NOW - timedelta(days=2, hours=3), "repeat": {"freq": "daily"}}
+    fires, nxt = reminders.plan_fires(it, NOW)
+    assert fires == 0
+    assert nxt is not None and nxt > NOW
+
+
+def test_parse_audience_double_at_is_plain_text():
+    assert reminders.parse_audience("@@ivan позвонить") == (None, "@ivan позвонить")
+
+
+def test_parse_audience_word_is_group_candidate():
+    aud, rest = reminders.parse_audience("@Sales_Team созвон")
+    assert aud == {"kind": "group", "name": "sales_team"}
+    assert rest == "созвон"
+
+
+def test_describe_audience_puts_group_name_in_code_span():
+    assert reminders.describe_audience({"kind": "group", "name": "sales_team"}) == "группе `sales_team`"
+
+
+def test_md_escape_neutralizes_markdown_entities():
+    assert reminders._md_escape("a_b *c* `d` [e]") == "a\\_b \\*c\\* \\`d\\` \\[e]"
@@ -1,13 +1,21 @@
 # webhook.py — вход для Render (free): aiohttp + aiogram webhook
 import os
+import json
+import math
+import uuid
+import asyncio
 import logging
+from datetime import datetime, timezone
 from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from Postavka import bot as main_bot, dp as main_dp, setup_handlers, refresh_access_cache
-from db import ensure_indexes
-from reminders import process_due_reminders
+from db import ensure_indexes, cron_runs
+from reminders import process_due_reminders, load_schedule
+from docs import start_http as docs_start_http, close_http as docs_close_http, prewarm as docs_prewarm
+from scheduler import scheduler, SCHEDULER_ENABLED
+import outbox
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("webhook")
@@ -17,6 +25,8 @@ WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "change-me")
 WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
 BASE_URL = os.environ.get("RENDER_EXTERNAL_URL") or os.environ.get("WEBHOOK_BASE")
 CRON_TOKEN = os.environ.get("CRON_TOKEN", "")
+CRON_BUDGET_SEC = float(os.environ.get("CRON_BUDGET_SEC", "40"))  # сколько держим HTTP-запрос крона
+CRON_BUDGET_MAX_SEC = 60.0  # верхняя граница ?budget=: дольше крон держать запрос не должен
 
 DELETE_WEBHOOK_ON_SHUTDOWN = os.environ.get("DELETE_WEBHOOK_ON_SHUTDOWN", "false").lower() == "true"
 
@@ -34,11 +44,23 @@ setup_handlers()
 async def on_startup(app: web.Application):
     await ensure_indexes()
     await refresh_access_cache()  # 🔑 подтянем allowlist из Mongo
+    await docs_start_http()
+    await docs_prewarm()  # дерево документов из снимка, перепроверка — в фоне
     url = BASE_URL.rstrip("/") + WEBHOOK_PATH
     await bot.set_webhook(url, secret_token=WEBHOOK_SECRET, drop_pending_updates=False)
     log.info("Webhook set to %s", url)
+    outbox.start(bot)  # добирает отложенные повторы доставки
+    if SCHEDULER_ENABLED:
+        await scheduler.start(lambda: process_due_reminders(bot), await load_schedule())
 
 async def on_shutdown(app: web.Application):
+    await scheduler.stop()
+    for task in list(_RUNS):
+        task.cancel()
+    if _RUNS:
+        await asyncio.gather(*_RUNS, return_exceptions=True)
+    await outbox.stop()
+    await docs_close_http()
     if DELETE_WEBHOOK_ON_SHUTDOWN:
         try:
             await bot.delete_webhook(drop_pending_updates=False)
@@ -51,12 +73,70 @@ async def on_shutdown(app: web.Application):
 async def health(_request: web.Request):
     return web.Response(text="ok")
 
-async def cron_due(request: web.Request):
+# ---- /cron/due: прогон в фоне, ответ не позже бюджета ----
+_RUNS: set[asyncio.Task] = set()  # держим ссылки, чтобы фоновые прогоны не собрал GC
+
+def _cron_authorized(request: web.Request) -> bool:
     token = request.headers.get("X-Cron-Token") or request.query.get("token")
-    if not CRON_TOKEN or token != CRON_TOKEN:
+    return bool(CRON_TOKEN) and token == CRON_TOKEN
+
+def _json(data, status: int = 200) -> web.Response:
+    return web.json_response(data, status=status, dumps=lambda o: json.dumps(o, default=str))
+
+async def _run_cron(run_id: str) -> dict:
+    async def progress(summary: dict):
+        await cron_runs.update_one(
+            {"_id": run_id},
+            {"$set": {"progress": summary, "updated_at": datetime.now(timezone.utc)}},
+        )
+
+    update = {}
+    try:
+        summary = await process_due_reminders(bot, on_progress=progress)
+        update = {"status": "done", "progress": summary}
+    except asyncio.CancelledError:
+        update = {"status": "interrupted"}
+        raise
+    except Exception as e:
+        log.exception("Cron run %s failed", run_id)
+        update = {"status": "failed", "error": str(e)}
+    finally:
+        update["finished_at"] = datetime.now(timezone.utc)
+        try:
+            await cron_runs.update_one({"_id": run_id}, {"$set": update})
+        except Exception:
+            log.exception("Cron run %s: failed to save status", run_id)
+    return update
+
+async def cron_due(request: web.Request):
+    if not _cron_authorized(request):
+        return web.Response(status=401, text="unauthorized")
+    try:
+        budget = float(request.query.get("budget", CRON_BUDGET_SEC))
+    except ValueError:
+        return web.Response(status=400, text="bad budget")
+    if not math.isfinite(budget) or not 0 < budget <= CRON_BUDGET_MAX_SEC:
+        return web.Response(status=400, text=f"budget must be in (0, {CRON_BUDGET_MAX_SEC:g}]")
+
+    run_id = uuid.uuid4().hex[:12]
+    await cron_runs.insert_one({"_id": run_id, "status": "running", "started_at": datetime.now(timezone.utc)})
+    task = asyncio.create_task(_run_cron(run_id))
+    _RUNS.add(task)
+    task.add_done_callback(_RUNS.discard)
+
+    done, _ = await asyncio.wait({task}, timeout=budget)
+    if task in done:
+        return _json({"run_id": run_id, **task.result()})
+    # не успели — отвечаем сразу, прогон продолжается в фоне
+    return _json({"run_id": run_id, "status": "running"}, status=202)
+
+async def cron_run_status(request: web.Request):
+    if not _cron_authorized(request):
         return web.Response(status=401, text="unauthorized")
-    processed = await process_due_reminders(bot)
-    return web.json_response({"processed": processed})
+    doc = await cron_runs.find_one({"_id": request.match_info["run_id"]})
+    if not doc:
+        return web.Response(status=404, text="not found")
+    return _json(doc)
 
 def create_app() -> web.Application:
     app = web.Application()
@@ -68,6 +148,7 @@ def create_app() -> web.Application:
 
     app.router.add_get("/", health)
     app.router.add_post("/cron/due", cron_due)
+    app.router.add_get("/cron/runs/{run_id}", cron_run_status)
 
     app.on_startup.append(on_startup)
     app.on_shutdown.append(on_shutdown)